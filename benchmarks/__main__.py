@@ -0,0 +1,58 @@
+"""Run benchmarks on seeded synthetic data and save results as JSON
+
+    python -m benchmarks --currencies 150 --dates 30 --output before.json
+    python -m benchmarks.compare before.json after.json
+
+Database benchmarks use a throwaway database, by default the one of
+`SQLALCHEMY_DATABASE_URL` suffixed with `_bench`, recreated for every suite.
+"""
+import argparse
+import os
+
+from . import bench_calculator, bench_endpoints, bench_import, bench_startup
+from .database import create_bench_database
+from .results import write_results
+
+SUITES = {
+    "calculator": bench_calculator.run,
+    "endpoints": bench_endpoints.run,
+    "import": bench_import.run,
+    "startup": bench_startup.run,
+}
+DATABASE_SUITES = {"endpoints", "import"}
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+parser.add_argument("--currencies", type=int, default=150)
+parser.add_argument("--dates", type=int, default=30)
+parser.add_argument(
+    "--density", type=float, default=0.05, help="Share of all pairs having prices"
+)
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--repeat", type=int, default=5)
+parser.add_argument("--batch-size", type=int, default=5000)
+parser.add_argument("--output", default="bench_results.json")
+parser.add_argument("--database-url")
+
+
+def main():
+    args = parser.parse_args()
+    database_url = args.database_url or os.environ["SQLALCHEMY_DATABASE_URL"] + "_bench"
+    params = {
+        name: value
+        for name, value in vars(args).items()
+        if name not in ("suites", "output", "database_url")
+    }
+    results = {}
+    for suite in args.suites:
+        kwargs = dict(params)
+        if suite in DATABASE_SUITES:
+            kwargs["session_factory"] = create_bench_database(database_url)
+        for name, result in SUITES[suite](**kwargs).items():
+            results[f"{suite}.{name}"] = result
+            print(f"{suite}.{name}: {result}")
+    write_results(args.output, params, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Compare throughput of the sync and async read endpoints
+
+Starts the app under uvicorn twice against an already populated database,
+without and with `SQLALCHEMY_ASYNC_DATABASE_URL`, and fires the same
+concurrent GET requests at both:
+
+    python -m benchmarks.async_vs_sync /prices/EUR/USD/2020-02-02 /currencies/
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument("paths", nargs="+", help="Paths requested in turn")
+parser.add_argument("--requests", type=int, default=2000)
+parser.add_argument("--concurrency", type=int, default=64)
+parser.add_argument("--port", type=int, default=8765)
+parser.add_argument(
+    "--async-database-url",
+    help="Defaults to SQLALCHEMY_DATABASE_URL with the asyncpg driver",
+)
+
+
+def start_server(port: int, env: dict, workers: int = 1) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "src.app:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/docs")
+            return server
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("Server did not start in 30 seconds")
+
+
+def run_requests(base_url: str, paths: list[str], count: int, concurrency: int):
+    def fetch(index: int) -> float:
+        started = time.perf_counter()
+        with urllib.request.urlopen(base_url + paths[index % len(paths)]) as resp:
+            resp.read()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        latencies = sorted(executor.map(fetch, range(count)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests_per_second": count / elapsed,
+        "latency_median_ms": statistics.median(latencies) * 1000,
+        "latency_p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    args = parser.parse_args()
+    sync_env = dict(os.environ)
+    sync_env.pop("SQLALCHEMY_ASYNC_DATABASE_URL", None)
+    async_env = dict(sync_env)
+    async_database_url = args.async_database_url
+    if async_database_url is None:
+        async_database_url = sync_env["SQLALCHEMY_DATABASE_URL"].replace(
+            "postgresql://", "postgresql+asyncpg://", 1
+        )
+    async_env["SQLALCHEMY_ASYNC_DATABASE_URL"] = async_database_url
+    for name, env in [("sync", sync_env), ("async", async_env)]:
+        server = start_server(args.port, env)
+        try:
+            base_url = f"http://127.0.0.1:{args.port}"
+            # Warm up caches so both modes are compared on the same footing
+            run_requests(base_url, args.paths, len(args.paths), 1)
+            result = run_requests(base_url, args.paths, args.requests, args.concurrency)
+        finally:
+            server.terminate()
+            server.wait()
+        print(
+            f"{name:>5}: {result['requests_per_second']:8.1f} req/s, "
+            f"median {result['latency_median_ms']:.1f} ms, "
+            f"p99 {result['latency_p99_ms']:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+from src.best_rate_calculator import RateGraph, calculate_best_rate
+from src.best_rate_matrix import BestRateMatrix
+from src.path_engines import ENGINES
+from src.rate_data import DECIMAL_PLACES
+
+from .synthetic import currency_codes, generate_prices
+from .timing import measure
+
+
+def run(currencies: int, density: float, seed: int, repeat: int, **_) -> dict:
+    _, prices = next(generate_prices(currencies, 1, density, seed))
+    data = sorted((sell, buy, price) for (sell, buy), price in prices.items())
+    codes = currency_codes(currencies)
+    sell, buy = codes[0], codes[-1]
+    rate_graph = RateGraph(data, DECIMAL_PLACES)
+    best_rates = BestRateMatrix(rate_graph)
+
+    def lookup_all_pairs():
+        for sell in codes:
+            for buy in codes:
+                best_rates.best_rate(sell, buy)
+
+    def find_all_paths(rate_graph):
+        for sell in codes:
+            for buy in codes:
+                rate_graph.shortest_path(sell, buy)
+
+    results = {
+        "calculate_best_rate": measure(
+            lambda: calculate_best_rate(sell, buy, data, DECIMAL_PLACES), repeat
+        ),
+        "rate_graph_build": measure(lambda: RateGraph(data, DECIMAL_PLACES), repeat),
+        "best_rate_matrix_build": measure(lambda: BestRateMatrix(rate_graph), repeat),
+        "best_rate_matrix_all_pairs_lookup": measure(lookup_all_pairs, repeat),
+    }
+    for name, engine in ENGINES.items():
+        engine_graph = RateGraph(data, DECIMAL_PLACES, engine=engine)
+        results[f"{name}_all_pairs_shortest_path"] = measure(
+            lambda: find_all_paths(engine_graph), repeat
+        )
+    return results
@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+from fastapi.testclient import TestClient
+
+from src.app import app
+from src.deps import get_db
+from src.rate_cache import rate_graph_cache
+
+from .database import seed_prices
+from .synthetic import START_DATE, currency_codes, generate_prices
+from .timing import measure
+
+
+def run(
+    session_factory,
+    currencies: int,
+    dates: int,
+    density: float,
+    seed: int,
+    repeat: int,
+    **_,
+) -> dict:
+    session = session_factory()
+    seed_prices(session, generate_prices(currencies, dates, density, seed))
+    session.close()
+
+    def get_bench_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = get_bench_db
+    codes = currency_codes(currencies)
+    sell, buy = codes[0], codes[-1]
+    last_date = START_DATE + timedelta(days=dates - 1)
+    history_start = max(START_DATE, last_date - timedelta(days=180))
+    batch = [
+        {
+            "sell": codes[i % currencies],
+            "buy": codes[-1 - i % currencies],
+            "date": (START_DATE + timedelta(days=i % dates)).isoformat(),
+        }
+        for i in range(100)
+    ]
+
+    def get(path: str):
+        def request():
+            resp = client.get(path)
+            assert resp.status_code == 200, resp.text
+
+        return request
+
+    def post_batch():
+        resp = client.post("/prices/best-rates", json=batch)
+        assert resp.status_code == 200, resp.text
+
+    try:
+        with TestClient(app) as client:
+            rate_path = f"/prices/{sell}/{buy}/{last_date}"
+            history_path = (
+                f"/prices/{codes[1]}/{codes[0]}"
+                f"?start_date={history_start}&end_date={last_date}"
+            )
+            series_path = (
+                f"/prices/{sell}/{buy}/best-series"
+                f"?start_date={START_DATE}&end_date={last_date}"
+            )
+            return {
+                "get_rate_cold": measure(
+                    get(rate_path), repeat, setup=rate_graph_cache.clear
+                ),
+                "get_rate_warm": measure(get(rate_path), repeat),
+                "best_rates_batch_100_cold": measure(
+                    post_batch, repeat, setup=rate_graph_cache.clear
+                ),
+                "get_historical_prices": measure(get(history_path), repeat),
+                "best_series_cold": measure(
+                    get(series_path), repeat, setup=rate_graph_cache.clear
+                ),
+            }
+    finally:
+        app.dependency_overrides.pop(get_db)
@@ -0,0 +1,41 @@
+import io
+import os
+import tempfile
+import time
+
+import import_initial_data
+
+from .database import reset_caches
+from .synthetic import write_wide_csv
+
+
+def run(
+    session_factory,
+    currencies: int,
+    dates: int,
+    density: float,
+    seed: int,
+    batch_size: int,
+    **_,
+) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "prices.csv")
+        count = write_wide_csv(path, currencies, dates, density, seed)
+        results = {}
+        # Second run updates every price instead of inserting it
+        for name in ["bulk_import_insert", "bulk_import_update"]:
+            reset_caches()
+            started = time.perf_counter()
+            import_initial_data.run_bulk_import(
+                path,
+                batch_size,
+                progress=io.StringIO(),
+                session_factory=session_factory,
+            )
+            elapsed = time.perf_counter() - started
+            results[name] = {
+                "prices": count,
+                "seconds": elapsed,
+                "rows_per_second": count / elapsed,
+            }
+    return results
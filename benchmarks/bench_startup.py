@@ -0,0 +1,45 @@
+"""Cold start of a worker process: importing the app and the first best rate"""
+import json
+import os
+import subprocess
+import sys
+
+from src.path_engines import ENGINES
+
+from .timing import summarize
+
+STARTUP_SCRIPT = """
+import json
+import time
+from decimal import Decimal
+
+started = time.perf_counter()
+import src.app
+
+imported = time.perf_counter()
+from src.rate_data import calculate_best_rates
+
+calculate_best_rates([("AAA", "AAB", Decimal("1.5"))]).best_rate("AAB", "AAA")
+print(json.dumps([imported - started, time.perf_counter() - imported]))
+"""
+
+
+def run(repeat: int, **_) -> dict:
+    results = {}
+    for engine in ENGINES:
+        import_timings = []
+        first_rate_timings = []
+        for _ in range(repeat):
+            output = subprocess.run(
+                [sys.executable, "-c", STARTUP_SCRIPT],
+                env={**os.environ, "PATH_ENGINE": engine},
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            import_seconds, first_rate_seconds = json.loads(output)
+            import_timings.append(import_seconds)
+            first_rate_timings.append(first_rate_seconds)
+        results[f"{engine}.import_app"] = summarize(import_timings)
+        results[f"{engine}.first_best_rate"] = summarize(first_rate_timings)
+    return results
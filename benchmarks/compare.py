@@ -0,0 +1,38 @@
+"""Compare two benchmark result files, exits with 1 on regressions"""
+import argparse
+import json
+import sys
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("baseline")
+parser.add_argument("current")
+parser.add_argument(
+    "--threshold",
+    type=float,
+    default=1.2,
+    help="Ratio of current to baseline time considered a regression",
+)
+
+
+def get_seconds(result: dict) -> float:
+    return result.get("median_s", result.get("seconds"))
+
+
+def main():
+    args = parser.parse_args()
+    with open(args.baseline) as baseline_file, open(args.current) as current_file:
+        baseline = json.load(baseline_file)["results"]
+        current = json.load(current_file)["results"]
+    regressed = False
+    for name in sorted(baseline.keys() & current.keys()):
+        ratio = get_seconds(current[name]) / get_seconds(baseline[name])
+        mark = ""
+        if ratio > args.threshold:
+            mark = " REGRESSION"
+            regressed = True
+        print(f"{name:<50} {ratio:6.2f}x{mark}")
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
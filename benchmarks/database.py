@@ -0,0 +1,51 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy_utils import create_database, database_exists, drop_database
+
+from src.crud_utils import create_currency, upsert_prices
+from src.currency_registry import currency_registry
+from src.rate_cache import rate_graph_cache
+from src.sqla_base import Base
+
+
+def create_bench_database(url: str) -> sessionmaker:
+    """Create an empty database with the app schema, dropping an existing one"""
+    if database_exists(url):
+        drop_database(url)
+    create_database(url)
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    reset_caches()
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def seed_prices(db_session, prices, batch_size: int = 5000) -> int:
+    """Store prices given as (date, {(sell code, buy code): price}) items"""
+    currency_ids = {}
+    count = 0
+    for day, day_prices in prices:
+        values = []
+        for (sell, buy), price in day_prices.items():
+            for code in (sell, buy):
+                if code not in currency_ids:
+                    currency_ids[code] = create_currency(db_session, code=code).id
+            values.append(
+                {
+                    "date": day,
+                    "sell_currency_id": currency_ids[sell],
+                    "buy_currency_id": currency_ids[buy],
+                    "price": price,
+                }
+            )
+        for start in range(0, len(values), batch_size):
+            end = start + batch_size
+            upsert_prices(db_session, values[start:end])
+        db_session.commit()
+        count += len(values)
+    reset_caches()
+    return count
+
+
+def reset_caches():
+    rate_graph_cache.clear()
+    currency_registry.clear()
@@ -0,0 +1,196 @@
+"""Load test read endpoints served by uvicorn workers on a throwaway database
+
+Seeds a database with synthetic prices using the schema creation of the tests,
+starts the app with `--workers` processes on it and fires the requests of every
+scenario from `--concurrency` clients:
+
+    python -m benchmarks.loadtest --workers 4 --concurrency 32 --output load.json
+
+Results hold throughput, latency percentiles and SQL statements per request,
+reported by the app in `Server-Timing` headers, and can be compared with
+`python -m benchmarks.compare` like other benchmark results.
+"""
+import argparse
+import http.client
+import os
+import random
+import re
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from sqlalchemy_utils import database_exists, drop_database
+
+from .async_vs_sync import start_server
+from .database import create_bench_database, seed_prices
+from .results import write_results
+from .synthetic import START_DATE, currency_codes, generate_prices
+
+SQL_STATEMENTS = re.compile(r'sql;desc="(\d+) statements"')
+# Seconds a request may take before it counts as an error
+TIMEOUT = 30
+
+
+def rate_path(rng: random.Random, codes: list[str], dates: int) -> str:
+    sell, buy = rng.sample(codes, 2)
+    day = START_DATE + timedelta(days=rng.randrange(dates))
+    return f"/prices/{sell}/{buy}/{day}"
+
+
+def rate_as_of_path(rng: random.Random, codes: list[str], dates: int) -> str:
+    return rate_path(rng, codes, dates + 30) + "?as_of=true"
+
+
+def history_path(rng: random.Random, codes: list[str], dates: int) -> str:
+    sell, buy = rng.sample(codes, 2)
+    start_date = START_DATE + timedelta(days=rng.randrange(dates))
+    end_date = start_date + timedelta(days=rng.randrange(1, 90))
+    return f"/prices/{sell}/{buy}?start_date={start_date}&end_date={end_date}"
+
+
+# Weighted paths requested in every scenario
+SCENARIOS = {
+    "rate": [(1, rate_path)],
+    "rate_as_of": [(1, rate_as_of_path)],
+    "history": [(1, history_path)],
+    "mixed": [(8, rate_path), (1, rate_as_of_path), (1, history_path)],
+}
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument(
+    "--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS)
+)
+parser.add_argument("--workers", type=int, default=1)
+parser.add_argument("--concurrency", type=int, default=32)
+parser.add_argument("--requests", type=int, default=2000, help="Per scenario")
+parser.add_argument(
+    "--warmup", type=int, default=200, help="Requests sent before measuring"
+)
+parser.add_argument("--currencies", type=int, default=150)
+parser.add_argument("--dates", type=int, default=30)
+parser.add_argument(
+    "--density", type=float, default=0.05, help="Share of all pairs having prices"
+)
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--port", type=int, default=8765)
+parser.add_argument("--output", default="loadtest_results.json")
+parser.add_argument(
+    "--database-url",
+    help="Database created for the run and dropped afterwards, must not exist, "
+    "defaults to SQLALCHEMY_DATABASE_URL suffixed with _loadtest",
+)
+
+
+def get_paths(scenario: str, count: int, rng: random.Random, codes, dates) -> list:
+    weights, path_functions = zip(*SCENARIOS[scenario])
+    return [
+        path_function(rng, codes, dates)
+        for path_function in rng.choices(path_functions, weights, k=count)
+    ]
+
+
+def run_requests(base_url: str, paths: list[str], concurrency: int) -> dict:
+    def fetch(path: str) -> tuple[float, bool, int]:
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(base_url + path, timeout=TIMEOUT) as resp:
+                resp.read()
+                server_timing = resp.headers.get("Server-Timing", "")
+                ok = True
+        except urllib.error.HTTPError as error:
+            server_timing = error.headers.get("Server-Timing", "")
+            ok = False
+        except (OSError, http.client.HTTPException):
+            # Refused or reset connections and timeouts count as errors
+            server_timing = ""
+            ok = False
+        match = SQL_STATEMENTS.search(server_timing)
+        sql_statements = int(match.group(1)) if match else 0
+        return time.perf_counter() - started, ok, sql_statements
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        responses = list(executor.map(fetch, paths))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(latency for latency, _, _ in responses)
+    sql_statements = sum(count for _, _, count in responses)
+    return {
+        "runs": len(paths),
+        "errors": sum(not ok for _, ok, _ in responses),
+        "requests_per_second": len(paths) / elapsed,
+        "median_s": _percentile(latencies, 50),
+        "p90_s": _percentile(latencies, 90),
+        "p99_s": _percentile(latencies, 99),
+        "max_s": latencies[-1],
+        "sql_statements_per_request": sql_statements / len(paths),
+    }
+
+
+def _percentile(sorted_values: list[float], percent: float) -> float:
+    index = max(0, round(len(sorted_values) * percent / 100) - 1)
+    return sorted_values[index]
+
+
+def main():
+    args = parser.parse_args()
+    database_url = (
+        args.database_url or os.environ["SQLALCHEMY_DATABASE_URL"] + "_loadtest"
+    )
+    if database_exists(database_url):
+        parser.error(
+            f"{database_url} already exists, the load test only uses a database "
+            "it creates and drops"
+        )
+    params = {
+        name: value
+        for name, value in vars(args).items()
+        if name not in ("scenarios", "output", "database_url", "port")
+    }
+    session_factory = create_bench_database(database_url)
+    session = session_factory()
+    try:
+        seed_prices(
+            session,
+            generate_prices(args.currencies, args.dates, args.density, args.seed),
+        )
+    finally:
+        session.close()
+        session_factory.kw["bind"].dispose()
+    env = {
+        **os.environ,
+        "SQLALCHEMY_DATABASE_URL": database_url,
+        "SERVER_TIMING": "1",
+    }
+    # Async endpoints are compared by `benchmarks.async_vs_sync`
+    env.pop("SQLALCHEMY_ASYNC_DATABASE_URL", None)
+    server = start_server(args.port, env, args.workers)
+    results = {}
+    try:
+        base_url = f"http://127.0.0.1:{args.port}"
+        rng = random.Random(args.seed)
+        codes = currency_codes(args.currencies)
+        for scenario in args.scenarios:
+            warmup_paths = get_paths(scenario, args.warmup, rng, codes, args.dates)
+            run_requests(base_url, warmup_paths, args.concurrency)
+            paths = get_paths(scenario, args.requests, rng, codes, args.dates)
+            result = run_requests(base_url, paths, args.concurrency)
+            results[f"loadtest.{scenario}"] = result
+            print(
+                f"{scenario:>10}: {result['requests_per_second']:8.1f} req/s, "
+                f"median {result['median_s'] * 1000:.1f} ms, "
+                f"p90 {result['p90_s'] * 1000:.1f} ms, "
+                f"p99 {result['p99_s'] * 1000:.1f} ms, "
+                f"{result['sql_statements_per_request']:.1f} SQL/request, "
+                f"{result['errors']} errors"
+            )
+    finally:
+        server.terminate()
+        server.wait()
+        drop_database(database_url)
+    write_results(args.output, params, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import json
+import platform
+import subprocess
+from datetime import datetime
+
+
+def write_results(path: str, params: dict, results: dict):
+    """Save results as JSON along with what they were measured on"""
+    with open(path, "w") as output:
+        json.dump(
+            {
+                "meta": {
+                    "commit": _get_commit(),
+                    "python": platform.python_version(),
+                    "created": datetime.now().isoformat(timespec="seconds"),
+                    "params": params,
+                },
+                "results": results,
+            },
+            output,
+            indent=2,
+        )
+
+
+def _get_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
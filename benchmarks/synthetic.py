@@ -0,0 +1,82 @@
+"""Seeded synthetic exchange rates
+
+Every currency gets a value following a random walk over dates, and prices of
+pairs are ratios of these values rounded to 4 places, so the data is realistic
+enough for the calculator: mostly consistent, with rounding noise only.
+"""
+import csv
+import itertools
+import math
+import random
+import string
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Iterator
+
+START_DATE = date(2020, 1, 1)
+
+
+def currency_codes(count: int) -> list[str]:
+    letters = itertools.product(string.ascii_uppercase, repeat=3)
+    return ["".join(code) for code in itertools.islice(letters, count)]
+
+
+def generate_pairs(
+    currencies: int, density: float, rng: random.Random
+) -> list[tuple[str, str]]:
+    """Pick connected pairs, `density` being the share of all possible pairs"""
+    codes = currency_codes(currencies)
+    # A random spanning tree keeps all currencies reachable from each other
+    pairs = {(codes[i], codes[rng.randrange(i)]) for i in range(1, currencies)}
+    all_pairs = list(itertools.combinations(codes, 2))
+    wanted = max(len(pairs), int(len(all_pairs) * density))
+    for pair in rng.sample(all_pairs, len(all_pairs)):
+        if len(pairs) >= wanted:
+            break
+        if pair[::-1] not in pairs:
+            pairs.add(pair)
+    return sorted(pairs)
+
+
+def generate_prices(
+    currencies: int,
+    dates: int,
+    density: float,
+    seed: int = 0,
+    start_date: date = START_DATE,
+) -> Iterator[tuple[date, dict[tuple[str, str], Decimal]]]:
+    """Generate prices of all pairs for every date"""
+    rng = random.Random(seed)
+    pairs = generate_pairs(currencies, density, rng)
+    log_values = {code: rng.gauss(0, 0.5) for code in currency_codes(currencies)}
+    for day_index in range(dates):
+        day = start_date + timedelta(days=day_index)
+        yield day, {
+            (sell, buy): _get_price(log_values[sell] - log_values[buy])
+            for sell, buy in pairs
+        }
+        for code in log_values:
+            log_values[code] += rng.gauss(0, 0.005)
+
+
+def write_wide_csv(path: str, *args, **kwargs) -> int:
+    """Write generated prices in the format read by import_initial_data.py
+
+    Takes the same arguments as `generate_prices`, returns number of prices.
+    """
+    count = 0
+    with open(path, "w", newline="") as csvfile:
+        writer = None
+        for day, prices in generate_prices(*args, **kwargs):
+            if writer is None:
+                fields = ["Date"] + [f"{sell}/{buy}" for sell, buy in prices]
+                writer = csv.DictWriter(csvfile, fieldnames=fields)
+                writer.writeheader()
+            row = {f"{sell}/{buy}": price for (sell, buy), price in prices.items()}
+            writer.writerow({"Date": day.isoformat(), **row})
+            count += len(prices)
+    return count
+
+
+def _get_price(log_price: float) -> Decimal:
+    return Decimal(math.exp(log_price)).quantize(Decimal("0.0001"))
@@ -0,0 +1,29 @@
+import statistics
+import time
+from typing import Callable, Optional
+
+
+def measure(
+    func: Callable[[], object],
+    repeat: int = 5,
+    setup: Optional[Callable[[], object]] = None,
+) -> dict:
+    """Time `repeat` calls of `func`, calling `setup` untimed before each"""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return summarize(timings)
+
+
+def summarize(timings: list[float]) -> dict:
+    repeat = len(timings)
+    return {
+        "runs": repeat,
+        "min_s": min(timings),
+        "median_s": statistics.median(timings),
+        "mean_s": statistics.mean(timings),
+    }
@@ -0,0 +1,42 @@
+import argparse
+import sys
+import time
+
+from src.price_store import PRICE_STORE_PATH, build_snapshot
+from src.sqla_base import SessionLocal
+
+parser = argparse.ArgumentParser(
+    description="Write snapshot of all prices for workers to map at startup."
+)
+parser.add_argument(
+    "--path",
+    default=PRICE_STORE_PATH,
+    help="Directory of price store snapshots, PRICE_STORE_PATH by default",
+)
+parser.add_argument(
+    "--interval",
+    type=float,
+    help="Keep running, writing a new snapshot every INTERVAL seconds",
+)
+
+
+def run_build(path: str, output=sys.stderr) -> str:
+    session = SessionLocal()
+    try:
+        # Prices and versions must be read from the same state of the database
+        session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        snapshot_path = build_snapshot(session, path)
+    finally:
+        session.close()
+    print(f"{snapshot_path}: snapshot written", file=output)
+    return snapshot_path
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if args.path is None:
+        parser.error("--path or PRICE_STORE_PATH is required")
+    run_build(args.path)
+    while args.interval:
+        time.sleep(args.interval)
+        run_build(args.path)
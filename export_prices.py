@@ -0,0 +1,58 @@
+import argparse
+import sys
+from datetime import date
+
+from src.currency_registry import currency_registry
+from src.price_export import iter_wide_csv
+from src.sqla_base import SessionLocal
+
+parser = argparse.ArgumentParser(
+    description="Export exchange rates data in the format of the import."
+)
+parser.add_argument("csv_file_path", help="Path of the csv file to write, - for stdout")
+parser.add_argument("--start-date", type=date.fromisoformat)
+parser.add_argument("--end-date", type=date.fromisoformat)
+parser.add_argument(
+    "--pairs",
+    nargs="+",
+    metavar="SELL/BUY",
+    help="Pairs of currencies to export, every pair having prices by default",
+)
+
+
+def run_export(csv_file_path: str, pairs=None, start_date=None, end_date=None):
+    session = SessionLocal()
+    try:
+        # Columns and prices must be read from the same state of the database
+        session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        pair_ids = None if pairs is None else _get_pair_ids(session, pairs)
+        lines = iter_wide_csv(session, pair_ids, start_date, end_date)
+        if csv_file_path == "-":
+            sys.stdout.writelines(lines)
+        else:
+            with open(csv_file_path, "w", newline="") as csvfile:
+                csvfile.writelines(lines)
+    finally:
+        session.close()
+
+
+def _get_pair_ids(session, pairs: list[str]) -> list[tuple[int, int]]:
+    codes = [pair.split("/") for pair in pairs]
+    if any(len(pair_codes) != 2 for pair_codes in codes):
+        parser.error("pairs must be given as SELL/BUY")
+    currency_ids = currency_registry.get_ids(
+        session, {code for pair_codes in codes for code in pair_codes}
+    )
+    for sell_code, buy_code in codes:
+        for code in (sell_code, buy_code):
+            if code not in currency_ids:
+                parser.error(f"Currency '{code}' does not exist")
+    return [
+        (currency_ids[sell_code], currency_ids[buy_code])
+        for sell_code, buy_code in codes
+    ]
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    run_export(args.csv_file_path, args.pairs, args.start_date, args.end_date)
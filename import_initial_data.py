@@ -1,12 +1,38 @@
 import argparse
 import csv
+import sys
+import time
 
-from src.crud_utils import create_currency
+from src.best_rate_calculator import CYCLE_GAIN_TOLERANCE
+from src.crud_utils import bump_data_versions, create_currency, upsert_prices
+from src.currency_registry import currency_registry
 from src.models_sqla import ExchangePairPrice
 from src.sqla_base import SessionLocal
 
 parser = argparse.ArgumentParser(description="Import exchange rates data.")
 parser.add_argument("csv_file_path", help="Path of the csv file to import")
+parser.add_argument(
+    "--bulk",
+    action="store_true",
+    help="Stream the file with batched upserts instead of a commit per price",
+)
+parser.add_argument(
+    "--batch-size",
+    type=int,
+    default=5000,
+    help="Number of prices written per transaction in bulk mode",
+)
+parser.add_argument(
+    "--check-arbitrage",
+    action="store_true",
+    help="Report profitable exchange cycles on imported dates and exit with 1",
+)
+parser.add_argument(
+    "--min-gain",
+    type=float,
+    default=CYCLE_GAIN_TOLERANCE,
+    help="Minimal relative gain of reported exchange cycles",
+)
 
 
 CurrencyIDs = dict[str, int]
@@ -29,12 +55,61 @@ def run_import(csv_file_path: str):
                     price=price,
                 )
                 session.add(price_obj)
+                bump_data_versions(session, [date])
                 session.commit()
 
 
+def run_bulk_import(
+    csv_file_path: str,
+    batch_size: int,
+    progress=sys.stderr,
+    session_factory=SessionLocal,
+):
+    """Import prices with batched upserts, overwriting already imported prices
+
+    Returns dates of imported prices.
+    """
+    session = session_factory()
+    started = time.monotonic()
+    imported = 0
+    dates = set()
+    with open(csv_file_path) as csvfile:
+        reader = csv.DictReader(csvfile)
+        currency_ids = _create_currencies(
+            session,
+            set(_get_currencies_from_headers(reader.fieldnames)),
+        )
+        for batch in _get_price_batches(reader, currency_ids, batch_size):
+            dates |= upsert_prices(session, batch)
+            session.commit()
+            imported += len(batch)
+            elapsed = time.monotonic() - started
+            print(
+                f"{imported} prices imported, {imported / elapsed:.0f} rows/sec",
+                file=progress,
+            )
+    session.close()
+    return dates
+
+
+def check_arbitrage(dates, min_gain: float, output=sys.stderr) -> bool:
+    """Report profitable exchange cycles on given dates, returns whether any"""
+    # Loads numpy, which imports not checking arbitrage do not need
+    from src.rate_data import build_best_rates
+
+    session = SessionLocal()
+    found = False
+    for date in sorted(dates):
+        for path, gain in build_best_rates(session, date).arbitrage_cycles(min_gain):
+            found = True
+            print(f"{date}: {'>'.join(path)} gains {gain:.4%}", file=output)
+    session.close()
+    return found
+
+
 def _create_currencies(session, currency_codes: set[str]) -> CurrencyIDs:
-    currency_ids = {}
-    for code in currency_codes:
+    currency_ids = currency_registry.get_ids(session, currency_codes)
+    for code in currency_codes - currency_ids.keys():
         currency = create_currency(session, code=code)
         currency_ids[code] = currency.id
     return currency_ids
@@ -58,6 +133,41 @@ def _get_prices_from_row(row: dict[str, str]):
         yield date, currency1, currency2, price
 
 
+def _get_price_batches(reader, currency_ids: CurrencyIDs, batch_size: int):
+    # Keyed by the unique constraint: one upsert cannot touch a row twice
+    batch = {}
+    for row in reader:
+        for date, currency1, currency2, price in _get_prices_from_row(row):
+            if not price:
+                continue
+            key = (date, currency_ids[currency1], currency_ids[currency2])
+            batch[key] = price
+        if len(batch) >= batch_size:
+            yield _get_price_values(batch)
+            batch = {}
+    if batch:
+        yield _get_price_values(batch)
+
+
+def _get_price_values(batch: dict) -> list[dict]:
+    return [
+        {
+            "date": date,
+            "sell_currency_id": sell_currency_id,
+            "buy_currency_id": buy_currency_id,
+            "price": price,
+        }
+        for (date, sell_currency_id, buy_currency_id), price in batch.items()
+    ]
+
+
 if __name__ == "__main__":
     args = parser.parse_args()
-    run_import(args.csv_file_path)
+    if args.check_arbitrage and not args.bulk:
+        parser.error("--check-arbitrage requires --bulk")
+    if args.bulk:
+        dates = run_bulk_import(args.csv_file_path, args.batch_size)
+        if args.check_arbitrage and check_arbitrage(dates, args.min_gain):
+            sys.exit(1)
+    else:
+        run_import(args.csv_file_path)
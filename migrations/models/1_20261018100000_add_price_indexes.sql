@@ -0,0 +1,6 @@
+-- upgrade --
+CREATE INDEX IF NOT EXISTS "idx_exchangepai_sell_cu_buy_cur_date" ON "exchangepairprice" ("sell_currency_id", "buy_currency_id", "date");
+CREATE INDEX IF NOT EXISTS "idx_exchangepai_buy_cur" ON "exchangepairprice" ("buy_currency_id");
+-- downgrade --
+DROP INDEX IF EXISTS "idx_exchangepai_buy_cur";
+DROP INDEX IF EXISTS "idx_exchangepai_sell_cu_buy_cur_date";
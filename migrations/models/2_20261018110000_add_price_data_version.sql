@@ -0,0 +1,8 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS "pricedataversion" (
+    "date" DATE NOT NULL PRIMARY KEY,
+    "version" INT NOT NULL DEFAULT 1
+);
+INSERT INTO "pricedataversion" ("date") SELECT DISTINCT "date" FROM "exchangepairprice";
+-- downgrade --
+DROP TABLE IF EXISTS "pricedataversion";
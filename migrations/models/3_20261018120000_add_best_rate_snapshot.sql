@@ -0,0 +1,16 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS "bestratesnapshot" (
+    "date" DATE NOT NULL,
+    "sell_currency_id" INT NOT NULL REFERENCES "currency" ("id") ON DELETE CASCADE,
+    "buy_currency_id" INT NOT NULL REFERENCES "currency" ("id") ON DELETE CASCADE,
+    "price" DECIMAL NOT NULL,
+    "path" INT[] NOT NULL,
+    PRIMARY KEY ("date", "sell_currency_id", "buy_currency_id")
+);
+CREATE TABLE IF NOT EXISTS "bestratesnapshotdate" (
+    "date" DATE NOT NULL PRIMARY KEY,
+    "version" INT NOT NULL
+);
+-- downgrade --
+DROP TABLE IF EXISTS "bestratesnapshotdate";
+DROP TABLE IF EXISTS "bestratesnapshot";
@@ -0,0 +1,34 @@
+import argparse
+import sys
+import time
+
+from src.rate_snapshots import refresh_snapshots
+from src.sqla_base import SessionLocal
+
+parser = argparse.ArgumentParser(
+    description="Recalculate best rate snapshots of dates with changed prices."
+)
+parser.add_argument(
+    "--interval",
+    type=float,
+    help="Keep running, checking for changed dates every INTERVAL seconds",
+)
+
+
+def run_refresh(output=sys.stderr) -> list:
+    session = SessionLocal()
+    try:
+        dates = refresh_snapshots(session)
+    finally:
+        session.close()
+    for date in dates:
+        print(f"{date}: snapshot refreshed", file=output)
+    return dates
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    run_refresh()
+    while args.interval:
+        time.sleep(args.interval)
+        run_refresh()
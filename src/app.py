@@ -1,10 +1,91 @@
-from fastapi import FastAPI
+import time
 
+from fastapi import APIRouter, FastAPI, Request
+from starlette.routing import Match
+
+from src import metrics
+from src.rate_executor import rate_executor
+from src.routers.convert import router as convert_router
 from src.routers.currencies import router as currencies_router
+from src.routers.live import router as live_router
+from src.routers.metrics import router as metrics_router
 from src.routers.prices import router as prices_routes
+from src.sqla_base import SQLALCHEMY_ASYNC_DATABASE_URL, async_engine, engine
 
 app = FastAPI()
 
+metrics.instrument_engine(engine)
+if async_engine is not None:
+    metrics.instrument_engine(async_engine.sync_engine)
+
+
+@app.middleware("http")
+async def collect_metrics(request: Request, call_next):
+    timings = metrics.start_request()
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        if metrics.SERVER_TIMING:
+            response.headers["Server-Timing"] = metrics.get_server_timing(timings)
+        return response
+    finally:
+        metrics.observe_request(
+            request.method,
+            _get_route_path(request),
+            status_code,
+            time.perf_counter() - started,
+            timings,
+        )
+
+
+@app.on_event("shutdown")
+def stop_rate_executor():
+    rate_executor.shutdown()
+
+
+def _get_route_path(request: Request) -> str:
+    """Path template of the matched route, keeping the number of labels bounded"""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+def _use_async_routes(async_router: APIRouter, prefix: str, tags: list[str]):
+    """Replace app routes by async routes with the same path and methods
+
+    Routes are replaced in place so the order in which paths are matched
+    stays the same as for the sync routes.
+    """
+    prefixed_router = APIRouter(dependency_overrides_provider=app)
+    prefixed_router.include_router(async_router, prefix=prefix, tags=tags)
+    for async_route in prefixed_router.routes:
+        for index, route in enumerate(app.router.routes):
+            if (route.path, getattr(route, "methods", None)) == (
+                async_route.path,
+                async_route.methods,
+            ):
+                app.router.routes[index] = async_route
+
 
 app.include_router(currencies_router, prefix="/currencies", tags=["currencies"])
 app.include_router(prices_routes, prefix="/prices", tags=["prices"])
+app.include_router(convert_router, prefix="/convert", tags=["convert"])
+app.include_router(metrics_router)
+app.include_router(live_router)
+
+
+def use_async_routes():
+    """Serve read endpoints having async variants with the async database driver"""
+    from src.routers.currencies_async import router as currencies_async_router
+    from src.routers.prices_async import router as prices_async_routes
+
+    _use_async_routes(currencies_async_router, "/currencies", ["currencies"])
+    _use_async_routes(prices_async_routes, "/prices", ["prices"])
+
+
+if SQLALCHEMY_ASYNC_DATABASE_URL:
+    use_async_routes()
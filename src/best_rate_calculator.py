@@ -1,60 +1,167 @@
-from decimal import Decimal, localcontext
+import copy
+import os
+from decimal import Context, Decimal, getcontext, localcontext
 from typing import Optional
 
-import igraph
+from src.metrics import span
+from src.path_engines import PathEngine, get_path_engine
 
+# Check every path price against the reference implementation
+VERIFY_PATH_PRICES = os.environ.get("BEST_RATE_VERIFY") == "1"
+# Cycles gaining less than this (in log space) are treated as rounding noise
+# of the stored prices rather than as arbitrage.
+CYCLE_GAIN_TOLERANCE = 1e-3
 
-def calculate_best_rate(
-    sell_currency_code: str,
-    buy_currency_code: str,
-    data: list[str, str, Decimal],
-    decimal_places: int,
-) -> Optional[Decimal]:
-    """Get best available price to exchange currencies on given date"""
 
-    def _get_path_price(path: list[int]) -> Decimal:
+class RateGraph:
+    """Currency graph and price table built from prices of a single date
+
+    Prices are kept per pair of currency indexes, `rates[i][j]` being the price
+    of exchanging currency `i` to `j`, inverse prices rounded to the precision
+    when the table is built. Prices which are not positive are bad data and
+    left out, rather than failing best rates of the whole date.
+    """
+
+    def __init__(
+        self,
+        data: list[str, str, Decimal],
+        decimal_places: int,
+        verify: bool = VERIFY_PATH_PRICES,
+        engine: Optional[PathEngine] = None,
+    ):
+        self.decimal_places = decimal_places
+        self.verify = verify
+        self.engine = engine or get_path_engine()
+        self.context = self._get_context()
+        data = _get_valid_prices(data)
+
+        nodes = set()
+        for sell_curr, buy_curr, price in data:
+            nodes.add(sell_curr)
+            nodes.add(buy_curr)
+        self.nodes = nodes
+
+        self.currency_by_index = {}
+        self.index_of_currency = {}
+        for index, currency_code in enumerate(sorted(nodes)):
+            self.index_of_currency[currency_code] = index
+            self.currency_by_index[index] = currency_code
+
+        self.pairs = frozenset((sell_curr, buy_curr) for sell_curr, buy_curr, _ in data)
+        self._set_prices(data)
+        self.edges = [
+            (self.index_of_currency[sell_curr], self.index_of_currency[buy_curr])
+            for sell_curr, buy_curr in sorted(self.pairs)
+        ]
+        self.graph = self.engine.build(len(nodes), self.edges)
+
+    def with_prices(self, data: list[str, str, Decimal]) -> "RateGraph":
+        """Get graph for prices of another date
+
+        The currency graph is reused when prices are given for the same pairs,
+        only the price table is rebuilt.
+        """
+        data = _get_valid_prices(data)
+        pairs = frozenset((sell_curr, buy_curr) for sell_curr, buy_curr, _ in data)
+        if pairs != self.pairs:
+            return RateGraph(data, self.decimal_places, self.verify, self.engine)
+        rate_graph = copy.copy(self)
+        rate_graph._set_prices(data)
+        return rate_graph
+
+    def best_rate(
+        self, sell_currency_code: str, buy_currency_code: str
+    ) -> Optional[Decimal]:
+        """Get price of the path with fewest exchanges between currencies"""
+        path = self.shortest_path(sell_currency_code, buy_currency_code)
+        if path is None:
+            return
+        return self.path_price(path)
+
+    def shortest_path(
+        self, sell_currency_code: str, buy_currency_code: str
+    ) -> Optional[list[int]]:
+        """Get indexes of currencies on the path with fewest exchanges"""
+        if (sell_currency_code not in self.nodes) or (
+            buy_currency_code not in self.nodes
+        ):
+            return
+        return self.engine.shortest_path(
+            self.graph,
+            self.index_of_currency[sell_currency_code],
+            self.index_of_currency[buy_currency_code],
+        )
+
+    def price(self, sell_index: int, buy_index: int) -> Decimal:
+        return self.rates[sell_index][buy_index]
+
+    def path_price(self, path: list[int]) -> Decimal:
+        """Multiply prices along the path, rounding every step to the precision"""
+        multiply = self.context.multiply
+        rates = self.rates
+        result = Decimal(1)
+        for sell_index, buy_index in zip(path, path[1:]):
+            result = multiply(result, rates[sell_index][buy_index])
+        if self.verify:
+            expected = self._get_reference_path_price(path)
+            if result != expected or str(result) != str(expected):
+                raise AssertionError(
+                    f"Price of path {path} is {result}, expected {expected}"
+                )
+        return result
+
+    def _get_context(self) -> Context:
+        context = getcontext().copy()
+        context.prec = self.decimal_places
+        return context
+
+    def _set_prices(self, data: list[str, str, Decimal]):
+        divide = self.context.divide
+        self.rates = [{} for _ in self.nodes]
+        for sell_curr, buy_curr, price in data:
+            sell_index = self.index_of_currency[sell_curr]
+            buy_index = self.index_of_currency[buy_curr]
+            self.rates[sell_index][buy_index] = price
+            self.rates[buy_index][sell_index] = divide(1, price)
+        if self.verify:
+            self._reference_prices = {}
+            with localcontext() as ctx:
+                ctx.prec = self.decimal_places
+                for sell_curr, buy_curr, price in data:
+                    self._reference_prices[f"{sell_curr}>{buy_curr}"] = price
+                    self._reference_prices[f"{buy_curr}>{sell_curr}"] = 1 / price
+
+    def _get_reference_path_price(self, path: list[int]) -> Decimal:
+        """Price of the path as calculated before prices were indexed"""
+        path = list(path)
         with localcontext() as ctx:
-            ctx.prec = decimal_places
+            ctx.prec = self.decimal_places
             result = Decimal(1)
             current_node = path.pop(0)
             while path:
                 next_node = path.pop(0)
-                current_node_code = currency_by_index[current_node]
-                next_node_code = currency_by_index[next_node]
-                price = prices[f"{current_node_code}>{next_node_code}"]
+                current_node_code = self.currency_by_index[current_node]
+                next_node_code = self.currency_by_index[next_node]
+                price = self._reference_prices[f"{current_node_code}>{next_node_code}"]
                 result *= price
                 current_node = next_node
         return result
 
-    nodes = set()
-    for sell_curr, buy_curr, price in data:
-        nodes.add(sell_curr)
-        nodes.add(buy_curr)
-    if (sell_currency_code not in nodes) or (buy_currency_code not in nodes):
-        return
-
-    currency_by_index = {}
-    index_of_currency = {}
-    for index, currency_code in enumerate(sorted(nodes)):
-        index_of_currency[currency_code] = index
-        currency_by_index[index] = currency_code
-
-    prices = {}
-    edges = []
-    with localcontext() as ctx:
-        ctx.prec = decimal_places
-        for sell_curr, buy_curr, price in data:
-            prices[f"{sell_curr}>{buy_curr}"] = price
-            prices[f"{buy_curr}>{sell_curr}"] = 1 / price
-            edges.append((index_of_currency[sell_curr], index_of_currency[buy_curr]))
-
-    g = igraph.Graph(len(nodes), edges)
-    paths = g.get_shortest_paths(
-        index_of_currency[sell_currency_code],
-        to=index_of_currency[buy_currency_code],
-        output="vpath",
-    )
-    not_connected = paths == [[]]
-    if not_connected:
-        return
-    return min([_get_path_price(p) for p in paths])
+
+def _get_valid_prices(data: list[str, str, Decimal]) -> list[str, str, Decimal]:
+    return [
+        (sell_curr, buy_curr, price) for sell_curr, buy_curr, price in data if price > 0
+    ]
+
+
+def calculate_best_rate(
+    sell_currency_code: str,
+    buy_currency_code: str,
+    data: list[str, str, Decimal],
+    decimal_places: int,
+) -> Optional[Decimal]:
+    """Get best available price to exchange currencies on given date"""
+    with span("rate_graph"):
+        rate_graph = RateGraph(data, decimal_places)
+    with span("best_rate"):
+        return rate_graph.best_rate(sell_currency_code, buy_currency_code)
@@ -0,0 +1,188 @@
+import math
+from decimal import Decimal
+from typing import Optional
+
+import numpy as np
+
+from src.best_rate_calculator import CYCLE_GAIN_TOLERANCE, RateGraph
+
+# Minimal improvement of a path weight to replace the current best path
+RELAXATION_EPSILON = 1e-12
+
+
+class BestRateMatrix:
+    """Best conversion rates between all currency pairs of a single date
+
+    Rates are relaxed in log space: the weight of exchanging currency `i` to `j`
+    is `-ln(rate)`, so the path with the lowest total weight gives the highest
+    amount of bought currency. Pairs whose paths may pass through a profitable
+    cycle have no well defined optimum, for them the better of the relaxed path
+    and the path with fewest exchanges is used.
+    """
+
+    def __init__(self, rate_graph: RateGraph):
+        self.rate_graph = rate_graph
+        n = len(rate_graph.nodes)
+
+        weights = np.full((n, n), np.inf)
+        np.fill_diagonal(weights, 0.0)
+        next_hop = np.full((n, n), -1, dtype=np.intp)
+        np.fill_diagonal(next_hop, np.arange(n))
+        for edge in rate_graph.edges:
+            for sell_index, buy_index in (edge, edge[::-1]):
+                price = rate_graph.price(sell_index, buy_index)
+                weights[sell_index, buy_index] = -math.log(price)
+                next_hop[sell_index, buy_index] = buy_index
+
+        not_diagonal = ~np.eye(n, dtype=bool)
+        for k in range(n):
+            via = weights[:, k, np.newaxis] + weights[np.newaxis, k, :]
+            better = (via < weights - RELAXATION_EPSILON) & not_diagonal
+            weights = np.where(better, via, weights)
+            next_hop = np.where(better, next_hop[:, k, np.newaxis], next_hop)
+
+        self.weights = weights
+        self.next_hop = next_hop
+
+        reachable = np.isfinite(weights)
+        # Weight of the cheapest exchange from `i` to `j` and back again
+        self.round_trip = np.where(reachable & reachable.T, weights + weights.T, 0.0)
+        self.cycle_nodes = self._get_cycle_nodes(CYCLE_GAIN_TOLERANCE)
+        via_cycle = reachable[:, self.cycle_nodes].astype(np.int64)
+        self.unresolved = (
+            via_cycle @ reachable[self.cycle_nodes, :].astype(np.int64)
+        ) > 0
+        self._paths = {}
+
+    def best_rate(
+        self, sell_currency_code: str, buy_currency_code: str
+    ) -> Optional[Decimal]:
+        """Get best available price to exchange currencies"""
+        path = self._path(sell_currency_code, buy_currency_code)
+        if path is None:
+            return
+        return self.rate_graph.path_price(path)
+
+    def best_path(
+        self, sell_currency_code: str, buy_currency_code: str
+    ) -> Optional[list[str]]:
+        """Get codes of currencies on the path giving the best price"""
+        path = self._path(sell_currency_code, buy_currency_code)
+        if path is None:
+            return
+        return [self.rate_graph.currency_by_index[index] for index in path]
+
+    def best_rates_of_pairs(
+        self, pairs: list[tuple[str, str]], with_paths: bool = False
+    ) -> list:
+        """Get best rate, or (rate, path) `with_paths`, of every (sell, buy) pair"""
+        if with_paths:
+            return [
+                (self.best_rate(sell, buy), self.best_path(sell, buy))
+                for sell, buy in pairs
+            ]
+        return [self.best_rate(sell, buy) for sell, buy in pairs]
+
+    def arbitrage_cycles(self, min_gain: float) -> list[tuple[list[str], Decimal]]:
+        """Find cycles of exchanges gaining at least `min_gain`, most gaining first
+
+        Every cycle is given as codes of currencies, starting and ending with the
+        same currency, along with its relative gain.
+        """
+        cycles = {}
+        for node in map(int, self._get_cycle_nodes(min_gain)):
+            other_node = int(self.round_trip[node].argmin())
+            walk = self._follow_next_hops(node, other_node)
+            if walk[-1] == other_node:
+                walk += self._follow_next_hops(other_node, node)[1:]
+            for cycle in _get_simple_cycles(walk):
+                if cycle not in cycles:
+                    cycles[cycle] = self._get_cycle_gain(cycle)
+        codes = self.rate_graph.currency_by_index
+        return sorted(
+            (
+                ([codes[index] for index in cycle + cycle[:1]], gain)
+                for cycle, gain in cycles.items()
+                if gain >= Decimal(str(min_gain))
+            ),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+
+    def _get_cycle_nodes(self, min_gain: float) -> np.ndarray:
+        round_trip = self.round_trip.min(axis=1, initial=0.0)
+        return np.flatnonzero(round_trip < -math.log1p(min_gain))
+
+    def _get_cycle_gain(self, cycle: tuple[int, ...]) -> Decimal:
+        result = Decimal(1)
+        for sell_index, buy_index in zip(cycle, cycle[1:] + cycle[:1]):
+            result *= self.rate_graph.price(sell_index, buy_index)
+        return result - 1
+
+    def _path(
+        self, sell_currency_code: str, buy_currency_code: str
+    ) -> Optional[list[int]]:
+        index_of_currency = self.rate_graph.index_of_currency
+        if (sell_currency_code not in index_of_currency) or (
+            buy_currency_code not in index_of_currency
+        ):
+            return
+        sell_index = index_of_currency[sell_currency_code]
+        buy_index = index_of_currency[buy_currency_code]
+        if not np.isfinite(self.weights[sell_index, buy_index]):
+            return
+        key = (sell_index, buy_index)
+        if key not in self._paths:
+            self._paths[key] = self._find_path(sell_index, buy_index)
+        return self._paths[key]
+
+    def _find_path(self, sell_index: int, buy_index: int) -> list[int]:
+        path = self._follow_next_hops(sell_index, buy_index)
+        if path[-1] != buy_index:
+            # Sub-tolerance cycles can make next hops loop
+            path = None
+        elif not self.unresolved[sell_index, buy_index]:
+            return path
+        candidates = [
+            self.rate_graph.shortest_path(
+                self.rate_graph.currency_by_index[sell_index],
+                self.rate_graph.currency_by_index[buy_index],
+            )
+        ]
+        if path is not None:
+            candidates.append(path)
+        return max(candidates, key=self.rate_graph.path_price)
+
+    def _follow_next_hops(self, sell_index: int, buy_index: int) -> list[int]:
+        """Walk next hops towards `buy_index`, stopping at the first repeated node"""
+        path = [sell_index]
+        visited = {sell_index}
+        current = sell_index
+        while current != buy_index:
+            current = int(self.next_hop[current, buy_index])
+            path.append(current)
+            if current in visited:
+                break
+            visited.add(current)
+        return path
+
+
+def _get_simple_cycles(walk: list[int]) -> set[tuple[int, ...]]:
+    """Split closed parts of the walk into cycles starting with the lowest node"""
+    cycles = set()
+    stack = []
+    position = {}
+    for node in walk:
+        if node in position:
+            start = position[node]
+            cycle = stack[start:]
+            for removed_node in stack[start + 1 :]:
+                del position[removed_node]
+            del stack[start + 1 :]
+            if len(cycle) > 1:
+                lowest = cycle.index(min(cycle))
+                cycles.add(tuple(cycle[lowest:] + cycle[:lowest]))
+        else:
+            position[node] = len(stack)
+            stack.append(node)
+    return cycles
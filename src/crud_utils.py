@@ -1,10 +1,16 @@
-from src.models_sqla import Currency, ExchangePairPrice
+from datetime import date
+
+from sqlalchemy.dialects.postgresql import insert
+
+from src.currency_registry import currency_registry
+from src.models_sqla import Currency, ExchangePairPrice, PriceDataVersion
 
 
 def create_currency(db_session, code) -> Currency:
     currency_obj = Currency(code=code)
     db_session.add(currency_obj)
     db_session.commit()
+    currency_registry.add(currency_obj.code, currency_obj.id)
     return currency_obj
 
 
@@ -16,5 +22,41 @@ def create_price(db_session, date, sell_currency, buy_currency, price) -> Curren
         price=price,
     )
     db_session.add(price_obj)
+    bump_data_versions(db_session, [date])
     db_session.commit()
     return price_obj
+
+
+def upsert_prices(db_session, values: list[dict]) -> set[date]:
+    """Insert prices, overwriting the ones already stored for the same pair and date
+
+    Every value must be unique by date, sell and buy currency. Returns dates of
+    written prices.
+    """
+    statement = insert(ExchangePairPrice).values(values)
+    statement = statement.on_conflict_do_update(
+        index_elements=["date", "sell_currency_id", "buy_currency_id"],
+        set_={"price": statement.excluded.price},
+    ).returning(ExchangePairPrice.date)
+    dates = {row.date for row in db_session.execute(statement)}
+    bump_data_versions(db_session, dates)
+    return dates
+
+
+def bump_data_versions(db_session, dates) -> dict:
+    """Increment versions of prices of given dates, to be committed with the prices
+
+    Returns new versions by date.
+    """
+    if not dates:
+        return {}
+    statement = insert(PriceDataVersion).values(
+        # Sorted for concurrent writers to lock rows in the same order
+        [{"date": day, "version": 1} for day in sorted(set(dates))]
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=["date"],
+        set_={"version": PriceDataVersion.version + 1},
+    )
+    statement = statement.returning(PriceDataVersion.date, PriceDataVersion.version)
+    return dict(db_session.execute(statement).all())
@@ -0,0 +1,85 @@
+from threading import Lock
+from typing import Iterable, Optional
+
+from src.models_sqla import Currency
+
+
+class CurrencyRegistry:
+    """In-process map between currency codes and ids
+
+    The map is loaded from the database on first use and refreshed by the
+    currency endpoints. Codes missing from the map are looked up in the
+    database, so currencies created by other processes are found as well;
+    renames and deletions made elsewhere need an explicit `load`.
+
+    `generation` changes whenever codes of known ids may have changed, for data
+    cached by code elsewhere to be told apart.
+    """
+
+    def __init__(self):
+        self._ids = None
+        self._codes = None
+        self.generation = 0
+        self._lock = Lock()
+
+    def load(self, db_session) -> tuple[dict[str, int], dict[int, str]]:
+        return self.load_rows(db_session.query(Currency.code, Currency.id))
+
+    def load_rows(
+        self, rows: Iterable[tuple[str, int]]
+    ) -> tuple[dict[str, int], dict[int, str]]:
+        ids = {code: currency_id for code, currency_id in rows}
+        codes = {currency_id: code for code, currency_id in ids.items()}
+        with self._lock:
+            self._ids = ids
+            self._codes = codes
+            self.generation += 1
+        return ids, codes
+
+    def clear(self):
+        with self._lock:
+            self._ids = None
+            self._codes = None
+            self.generation += 1
+
+    def add(self, code: str, currency_id: int):
+        with self._lock:
+            if self._ids is not None:
+                self._ids[code] = currency_id
+                self._codes[currency_id] = code
+
+    def get_id(self, db_session, code: str) -> Optional[int]:
+        return self.get_ids(db_session, [code]).get(code)
+
+    def get_ids(self, db_session, codes: Iterable[str]) -> dict[str, int]:
+        """Get ids of given currency codes, unknown codes are left out"""
+        codes = set(codes)
+        ids, _ = self._get_maps(db_session)
+        currency_ids = {code: ids[code] for code in codes if code in ids}
+        missing_codes = codes - currency_ids.keys()
+        if missing_codes:
+            currencies = db_session.query(Currency.code, Currency.id).filter(
+                Currency.code.in_(missing_codes)
+            )
+            for code, currency_id in currencies:
+                self.add(code, currency_id)
+                currency_ids[code] = currency_id
+        return currency_ids
+
+    def get_code(self, db_session, currency_id: int) -> str:
+        _, codes = self._get_maps(db_session)
+        code = codes.get(currency_id)
+        if code is None:
+            code = db_session.query(Currency.code).filter_by(id=currency_id).scalar()
+            self.add(code, currency_id)
+        return code
+
+    def _get_maps(self, db_session) -> tuple[dict[str, int], dict[int, str]]:
+        with self._lock:
+            ids, codes = self._ids, self._codes
+        if ids is None:
+            ids, codes = self.load(db_session)
+        return ids, codes
+
+
+currency_registry = CurrencyRegistry()
@@ -1,4 +1,4 @@
-from src.sqla_base import SessionLocal
+from src.sqla_base import AsyncSessionLocal, SessionLocal
 
 
 def get_db():
@@ -7,3 +7,18 @@ def get_db():
         yield session
     finally:
         session.close()
+
+
+def get_repeatable_read_db():
+    """Session reading every query from the same state of the database"""
+    session = SessionLocal()
+    session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as session:
+        yield session
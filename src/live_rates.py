@@ -0,0 +1,120 @@
+"""Best rates pushed to subscribed clients when prices of their date change
+
+Subscriptions are kept per process, so clients are only notified of changes
+written through the same worker. Rates of every subscribed pair of a changed
+date are calculated once and handed to all its subscribers, which only send
+rates differing from the ones they sent before.
+"""
+import asyncio
+import logging
+import threading
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+
+from src.rate_data import RateKey, get_best_rates_by_key
+from src.rate_executor import RateExecutorUnavailable
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    """Connection receiving rates, fed from any thread and read on its event loop"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.keys = set()
+        self._loop = loop
+        self._pending = {}
+        self._sent = {}
+        self._ready = asyncio.Event()
+
+    def push(self, prices: dict[RateKey, Optional[Decimal]]):
+        self._loop.call_soon_threadsafe(self._push, prices)
+
+    def _push(self, prices: dict[RateKey, Optional[Decimal]]):
+        # Rates not sent yet are replaced by newer ones
+        self._pending.update(prices)
+        self._ready.set()
+
+    def forget(self, keys: set[RateKey]):
+        for key in keys:
+            self._sent.pop(key, None)
+            self._pending.pop(key, None)
+
+    async def changes(self) -> dict[RateKey, Optional[Decimal]]:
+        """Wait for rates of subscribed pairs differing from the ones last sent"""
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            pending, self._pending = self._pending, {}
+            changed = {
+                key: price
+                for key, price in pending.items()
+                if key in self.keys
+                and (key not in self._sent or self._sent[key] != price)
+            }
+            if changed:
+                self._sent.update(changed)
+                return changed
+
+
+class LiveRates:
+    def __init__(self):
+        self._subscribers_by_date = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, subscriber: Subscriber, keys: set[RateKey]):
+        with self._lock:
+            subscriber.keys |= keys
+            for day, _, _ in keys:
+                self._subscribers_by_date.setdefault(day, set()).add(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber, keys: set[RateKey]):
+        with self._lock:
+            subscriber.keys -= keys
+            subscriber.forget(keys)
+            self._remove_unused_dates(subscriber, {day for day, _, _ in keys})
+
+    def disconnect(self, subscriber: Subscriber):
+        with self._lock:
+            dates = {day for day, _, _ in subscriber.keys}
+            subscriber.keys = set()
+            self._remove_unused_dates(subscriber, dates)
+
+    def publish(self, db_session, date: date):
+        """Send best rates of pairs subscribed on a date whose prices changed"""
+        with self._lock:
+            subscribers = [
+                (subscriber, [key for key in subscriber.keys if key[0] == date])
+                for subscriber in self._subscribers_by_date.get(date, ())
+            ]
+        if not subscribers:
+            return
+        try:
+            prices = self.get_prices(
+                db_session, {key for _, keys in subscribers for key in keys}
+            )
+        except RateExecutorUnavailable as error:
+            logger.warning("Best rates of %s not published: %s", date, error)
+            return
+        for subscriber, keys in subscribers:
+            subscriber.push({key: prices[key] for key in keys})
+
+    def get_prices(self, db_session, keys: set[RateKey]) -> dict:
+        """Get current best rates of subscribed pairs
+
+        Raises RateExecutorUnavailable when the rate executor cannot calculate
+        them in time.
+        """
+        return get_best_rates_by_key(db_session, keys)
+
+    def _remove_unused_dates(self, subscriber: Subscriber, dates: set[date]):
+        subscribed_dates = {day for day, _, _ in subscriber.keys}
+        for day in dates - subscribed_dates:
+            day_subscribers = self._subscribers_by_date.get(day, set())
+            day_subscribers.discard(subscriber)
+            if not day_subscribers:
+                self._subscribers_by_date.pop(day, None)
+
+
+live_rates = LiveRates()
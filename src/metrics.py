@@ -0,0 +1,225 @@
+"""Request metrics exposed in the Prometheus text format
+
+Metrics are kept per process. Time spent by a request is broken down into SQL
+statements, reported through engine events, and named spans of the rate
+calculation, collected in a `RequestTimings` bound to the request context.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+# Requests taking longer are logged with their breakdown, disabled when unset
+SLOW_REQUEST_SECONDS = float(os.environ.get("SLOW_REQUEST_SECONDS", 0)) or None
+# Responses carry the breakdown in a `Server-Timing` header when set
+SERVER_TIMING = os.environ.get("SERVER_TIMING") == "1"
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...],
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple[str, ...], value: float):
+        with self._lock:
+            if labels not in self._values:
+                self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            bucket_counts, _, _ = values = self._values[labels]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    bucket_counts[index] += 1
+            values[1] += value
+            values[2] += 1
+
+    def collect(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            values = sorted(
+                (labels, (list(counts), total, count))
+                for labels, (counts, total, count) in self._values.items()
+            )
+        for labels, (bucket_counts, total, count) in values:
+            label_pairs = list(zip(self.label_names, labels))
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                bucket_labels = _format_labels(label_pairs + [("le", str(bound))])
+                lines.append(f"{self.name}_bucket{bucket_labels} {bucket_count}")
+            inf_labels = _format_labels(label_pairs + [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{inf_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(label_pairs)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(label_pairs)} {count}")
+        return lines
+
+
+class RequestTimings:
+    """Time spent by a single request, by kind of work"""
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.spans = {}
+
+    def add_span(self, name: str, seconds: float):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time until response headers are sent",
+    ("method", "route", "status"),
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements",
+    "SQL statements executed per request",
+    ("method", "route"),
+    COUNT_BUCKETS,
+)
+REQUEST_SQL_DURATION = Histogram(
+    "http_request_sql_duration_seconds",
+    "Time spent executing SQL statements per request",
+    ("method", "route"),
+)
+SPAN_DURATION = Histogram(
+    "span_duration_seconds",
+    "Time spent in named parts of the rate calculation",
+    ("span",),
+)
+HISTOGRAMS = [
+    REQUEST_DURATION,
+    REQUEST_SQL_STATEMENTS,
+    REQUEST_SQL_DURATION,
+    SPAN_DURATION,
+]
+
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request() -> RequestTimings:
+    """Collect timings of the code running in the current context"""
+    timings = RequestTimings()
+    _request_timings.set(timings)
+    return timings
+
+
+def get_request_timings() -> Optional[RequestTimings]:
+    return _request_timings.get()
+
+
+def observe_request(
+    method: str, route: str, status: int, seconds: float, timings: RequestTimings
+):
+    REQUEST_DURATION.observe((method, route, str(status)), seconds)
+    REQUEST_SQL_STATEMENTS.observe((method, route), timings.sql_count)
+    REQUEST_SQL_DURATION.observe((method, route), timings.sql_seconds)
+    if SLOW_REQUEST_SECONDS is not None and seconds >= SLOW_REQUEST_SECONDS:
+        logger.warning(
+            "Slow request %s %s: %.3fs, %d SQL statements in %.3fs, spans: %s",
+            method,
+            route,
+            seconds,
+            timings.sql_count,
+            timings.sql_seconds,
+            ", ".join(
+                f"{name} {span_seconds:.3f}s"
+                for name, span_seconds in timings.spans.items()
+            )
+            or "none",
+        )
+
+
+def get_server_timing(timings: RequestTimings) -> str:
+    """Format the breakdown of a request as a `Server-Timing` header value"""
+    sql_ms = timings.sql_seconds * 1000
+    entries = [f'sql;desc="{timings.sql_count} statements";dur={sql_ms:.3f}']
+    entries.extend(
+        f"{name};dur={seconds * 1000:.3f}" for name, seconds in timings.spans.items()
+    )
+    return ", ".join(entries)
+
+
+@contextmanager
+def span(name: str):
+    """Time a part of the work done for the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        SPAN_DURATION.observe((name,), seconds)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.add_span(name, seconds)
+
+
+def instrument_engine(engine):
+    """Count SQL statements executed with the engine and time them"""
+    for identifier, listener in ENGINE_LISTENERS:
+        event.listen(engine, identifier, listener)
+
+
+def _before_cursor_execute(conn, cursor, statement, params, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, params, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_started"].pop()
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.sql_count += 1
+        timings.sql_seconds += seconds
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+# (event name, listener) added to instrumented engines
+ENGINE_LISTENERS = (
+    ("before_cursor_execute", _before_cursor_execute),
+    ("after_cursor_execute", _after_cursor_execute),
+    ("handle_error", _handle_error),
+)
+
+
+def render() -> str:
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.collect())
+    return "\n".join(lines) + "\n"
+
+
+def _format_labels(label_pairs: list[tuple[str, str]]) -> str:
+    if not label_pairs:
+        return ""
+    return (
+        "{"
+        + ",".join(f'{name}="{_escape(value)}"' for name, value in label_pairs)
+        + "}"
+    )
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -3,10 +3,12 @@ from sqlalchemy import (
     Column,
     Date,
     ForeignKey,
+    Index,
     Integer,
     String,
     UniqueConstraint,
 )
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship
 
 from src.sqla_base import Base
@@ -23,7 +25,18 @@ class Currency(Base):
 
 class ExchangePairPrice(Base):
     __tablename__ = "exchangepairprice"
-    __table_args__ = (UniqueConstraint("date", "sell_currency_id", "buy_currency_id"),)
+    __table_args__ = (
+        UniqueConstraint("date", "sell_currency_id", "buy_currency_id"),
+        # Prices of a pair over a date range, also probes of the reverse pair
+        Index(
+            "idx_exchangepai_sell_cu_buy_cur_date",
+            "sell_currency_id",
+            "buy_currency_id",
+            "date",
+        ),
+        # Lookups by bought currency, e.g. when deleting a currency
+        Index("idx_exchangepai_buy_cur", "buy_currency_id"),
+    )
 
     id = Column(Integer, primary_key=True)
     date = Column(Date)
@@ -36,3 +49,34 @@ class ExchangePairPrice(Base):
 
     def __str__(self):
         return "%s: %s/%s" % (self.date, self.sell_currency, self.buy_currency)
+
+
+class PriceDataVersion(Base):
+    """Version of prices of a date, bumped on every change of them"""
+
+    __tablename__ = "pricedataversion"
+
+    date = Column(Date, primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
+
+
+class BestRateSnapshot(Base):
+    """Best rate and its path between currencies, precalculated for a date"""
+
+    __tablename__ = "bestratesnapshot"
+
+    date = Column(Date, primary_key=True)
+    sell_currency_id = Column(Integer, ForeignKey("currency.id"), primary_key=True)
+    buy_currency_id = Column(Integer, ForeignKey("currency.id"), primary_key=True)
+    price = Column(DECIMAL, nullable=False)
+    # Ids of currencies exchanged through, from the sold to the bought one
+    path = Column(ARRAY(Integer), nullable=False)
+
+
+class BestRateSnapshotDate(Base):
+    """Version of prices the snapshot of a date was calculated from"""
+
+    __tablename__ = "bestratesnapshotdate"
+
+    date = Column(Date, primary_key=True)
+    version = Column(Integer, nullable=False)
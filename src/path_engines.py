@@ -0,0 +1,88 @@
+"""Engines finding paths with fewest exchanges in currency graphs
+
+Graphs are undirected, nodes being currency indexes and edges priced pairs.
+`PATH_ENGINE` selects the engine: `igraph`, imported on first use, or `bfs`, a
+breadth-first search in plain Python. The latter is a few times slower per
+search, but needs no compiled extension to be loaded for paths, which matters
+for short lived processes calculating few rates. Best rate matrices still
+load numpy. Both return the same path when several
+have the fewest exchanges.
+"""
+import os
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Optional
+
+PATH_ENGINE = os.environ.get("PATH_ENGINE", "igraph")
+
+
+class PathEngine(ABC):
+    name = None
+
+    @abstractmethod
+    def build(self, node_count: int, edges: list[tuple[int, int]]):
+        """Get graph of the nodes connected by `edges`"""
+
+    @abstractmethod
+    def shortest_path(self, graph, source: int, target: int) -> Optional[list[int]]:
+        """Get nodes on the path with fewest edges, None when not connected"""
+
+
+class IgraphEngine(PathEngine):
+    name = "igraph"
+
+    def build(self, node_count: int, edges: list[tuple[int, int]]):
+        # Loading the extension is only paid once a graph is built
+        import igraph
+
+        return igraph.Graph(node_count, edges)
+
+    def shortest_path(self, graph, source: int, target: int) -> Optional[list[int]]:
+        paths = graph.get_shortest_paths(source, to=target, output="vpath")
+        not_connected = paths == [[]]
+        if not_connected:
+            return
+        return paths[0]
+
+
+class BfsEngine(PathEngine):
+    name = "bfs"
+
+    def build(self, node_count: int, edges: list[tuple[int, int]]):
+        neighbors = [set() for _ in range(node_count)]
+        for sell_index, buy_index in edges:
+            neighbors[sell_index].add(buy_index)
+            neighbors[buy_index].add(sell_index)
+        # Visited in order of index, as igraph does
+        return [sorted(node_neighbors) for node_neighbors in neighbors]
+
+    def shortest_path(self, graph, source: int, target: int) -> Optional[list[int]]:
+        previous = {source: None}
+        queue = deque([source])
+        while queue and target not in previous:
+            node = queue.popleft()
+            for neighbor in graph[node]:
+                if neighbor not in previous:
+                    previous[neighbor] = node
+                    queue.append(neighbor)
+        if target not in previous:
+            return
+        path = []
+        node = target
+        while node is not None:
+            path.append(node)
+            node = previous[node]
+        path.reverse()
+        return path
+
+
+ENGINES = {engine.name: engine for engine in (IgraphEngine(), BfsEngine())}
+
+
+def get_path_engine(name: str = PATH_ENGINE) -> PathEngine:
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown path engine {name!r}, expected one of {', '.join(ENGINES)}"
+        )
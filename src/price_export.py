@@ -0,0 +1,96 @@
+"""Prices exported in the wide CSV format read by `import_initial_data`
+
+Every row holds the prices of a date, one `SELL/BUY` column per pair of
+currencies. Prices are read from a server-side cursor ordered by date and
+pivoted one date at a time, so the whole table is never held in memory.
+"""
+import csv
+import io
+import itertools
+from datetime import date
+from typing import Iterator, Optional
+
+from sqlalchemy import tuple_
+
+from src.currency_registry import currency_registry
+from src.models_sqla import ExchangePairPrice
+from src.rate_data import get_price_pairs_cte
+
+# Rows fetched from the server-side cursor at once
+FETCH_SIZE = 10000
+
+# (sell currency id, buy currency id)
+Pair = tuple[int, int]
+
+
+def get_export_pairs(db_session) -> list[Pair]:
+    """Get every pair of currencies having prices"""
+    pairs = get_price_pairs_cte()
+    return [
+        (sell_id, buy_id)
+        for sell_id, buy_id in db_session.query(
+            pairs.c.sell_currency_id, pairs.c.buy_currency_id
+        )
+    ]
+
+
+def iter_wide_csv(
+    db_session,
+    pairs: Optional[list[Pair]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> Iterator[str]:
+    """Yield CSV lines of prices of given pairs, every pair when not given
+
+    Columns are ordered by currency codes, dates without prices of a pair
+    have an empty cell. Pairs and prices are only consistent when read in a
+    REPEATABLE READ transaction, prices of pairs added in between are left out.
+    """
+    selected = pairs is not None
+    if not selected:
+        pairs = get_export_pairs(db_session)
+    columns = sorted(
+        (
+            currency_registry.get_code(db_session, sell_id),
+            currency_registry.get_code(db_session, buy_id),
+            sell_id,
+            buy_id,
+        )
+        for sell_id, buy_id in set(pairs)
+    )
+    indexes = {
+        (sell_id, buy_id): index
+        for index, (_, _, sell_id, buy_id) in enumerate(columns)
+    }
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    def get_line(row: list) -> str:
+        writer.writerow(row)
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    yield get_line(["Date"] + [f"{sell}/{buy}" for sell, buy, _, _ in columns])
+    if not columns:
+        return
+    sell_id = ExchangePairPrice.sell_currency_id
+    buy_id = ExchangePairPrice.buy_currency_id
+    query = db_session.query(
+        ExchangePairPrice.date, sell_id, buy_id, ExchangePairPrice.price
+    )
+    if selected:
+        query = query.filter(tuple_(sell_id, buy_id).in_(list(indexes)))
+    if start_date is not None:
+        query = query.filter(ExchangePairPrice.date >= start_date)
+    if end_date is not None:
+        query = query.filter(ExchangePairPrice.date <= end_date)
+    rows = query.order_by(ExchangePairPrice.date).yield_per(FETCH_SIZE)
+    for day, day_rows in itertools.groupby(rows, key=lambda row: row.date):
+        prices = [""] * len(columns)
+        for _, sell_currency_id, buy_currency_id, price in day_rows:
+            index = indexes.get((sell_currency_id, buy_currency_id))
+            if index is not None:
+                prices[index] = price
+        yield get_line([day.isoformat()] + prices)
@@ -0,0 +1,328 @@
+"""Columnar copy of all prices kept in memory-mapped snapshot files
+
+A snapshot holds prices as typed arrays sorted by pair and date: `keys` with
+the pair index in the high and the date ordinal in the low 32 bits, `prices`
+scaled to integers, `pairs` with currency ids of every pair index and
+`versions` with data versions of dates at the time it was built.
+Snapshot directories are switched atomically through the `current` symlink,
+so every worker maps the same page cached files.
+
+Prices of a date are only served while the data version of the date equals
+the one the snapshot (or a change applied on top of it) was made for, and are
+read from the database otherwise.
+"""
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import func
+
+from src.models_sqla import ExchangePairPrice, PriceDataVersion
+
+# Directory holding snapshots, the store is disabled when unset
+PRICE_STORE_PATH = os.environ.get("PRICE_STORE_PATH")
+# Prices are stored as integers of 1/10^PRICE_SCALE
+PRICE_SCALE = 4
+FETCH_SIZE = 10000
+
+PAIR_DTYPE = np.dtype([("sell_id", "<i4"), ("buy_id", "<i4")])
+VERSION_DTYPE = np.dtype([("date", "<i4"), ("version", "<i8")])
+ARRAY_NAMES = ("keys", "prices", "pairs", "versions")
+
+PriceRow = namedtuple("PriceRow", ["sell_currency_id", "buy_currency_id", "price"])
+
+
+class PriceSnapshot:
+    def __init__(self, keys, prices, pairs, versions):
+        self.keys = keys
+        self.prices = prices
+        self.pairs = pairs
+        self.versions = versions
+        self.index_of_pair = {
+            (int(sell_id), int(buy_id)): index
+            for index, (sell_id, buy_id) in enumerate(pairs.tolist())
+        }
+        self.pair_keys = np.arange(len(pairs), dtype=np.int64) << 32
+
+    @classmethod
+    def load(cls, path: str) -> "PriceSnapshot":
+        return cls(
+            *(
+                np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                for name in ARRAY_NAMES
+            )
+        )
+
+    def save(self, path: str):
+        os.makedirs(path)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+
+    def version(self, day: int) -> int:
+        index = np.searchsorted(self.versions["date"], day)
+        if index < len(self.versions) and self.versions["date"][index] == day:
+            return int(self.versions["version"][index])
+        return 0
+
+    def versions_between(self, start: int, end: int) -> dict[int, int]:
+        dates = self.versions["date"]
+        start_index, end_index = np.searchsorted(dates, [start, end + 1])
+        selected = self.versions[start_index:end_index]
+        return dict(zip(selected["date"].tolist(), selected["version"].tolist()))
+
+    def cumulative_version(self, end: int) -> int:
+        end_index = np.searchsorted(self.versions["date"], end, side="right")
+        return int(self.versions["version"][:end_index].sum())
+
+    def prices_on(self, day: int, latest: bool = False) -> dict[tuple, int]:
+        """Get prices of every pair on a date, or the latest ones up to it"""
+        search_keys = self.pair_keys | day
+        if latest:
+            indexes = np.searchsorted(self.keys, search_keys, side="right") - 1
+            found = indexes >= 0
+            found[found] = (self.keys[indexes[found]] >> 32) == np.flatnonzero(found)
+        else:
+            indexes = np.searchsorted(self.keys, search_keys)
+            found = indexes < len(self.keys)
+            found[found] = self.keys[indexes[found]] == search_keys[found]
+        pair_indexes = np.flatnonzero(found)
+        return dict(
+            zip(
+                map(tuple, self.pairs[pair_indexes].tolist()),
+                self.prices[indexes[found]].tolist(),
+            )
+        )
+
+    def pair_prices(self, pair: tuple[int, int], start: int, end: int) -> dict:
+        """Get prices of a pair by date ordinal"""
+        index = self.index_of_pair.get(pair)
+        if index is None:
+            return {}
+        start_index, end_index = np.searchsorted(
+            self.keys, [(index << 32) | start, (index << 32) | end + 1]
+        )
+        return dict(
+            zip(
+                (self.keys[start_index:end_index] & 0xFFFFFFFF).tolist(),
+                self.prices[start_index:end_index].tolist(),
+            )
+        )
+
+
+class PriceStore:
+    """Snapshot of prices mapped by this process with changes made through it
+
+    Changes are kept per date along with the data version they lead to, and
+    are only applied when made on top of the version already known.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.configure(path)
+
+    def configure(self, path: Optional[str]):
+        self.path = path
+        self._snapshot = None
+        self._snapshot_id = None
+        # Date ordinal: (version, {(sell id, buy id): scaled price or None})
+        self._changes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def get_prices(self, day: date, version: int) -> Optional[list[PriceRow]]:
+        """Get prices of a date if known for its current data `version`"""
+        snapshot = self._get_snapshot()
+        if snapshot is None:
+            return
+        ordinal = day.toordinal()
+        with self._lock:
+            change_version, changes = self._changes.get(ordinal, (None, {}))
+            if (change_version or snapshot.version(ordinal)) != version:
+                return
+            prices = snapshot.prices_on(ordinal)
+            prices.update(changes)
+        return [
+            PriceRow(sell_id, buy_id, _to_decimal(price))
+            for (sell_id, buy_id), price in prices.items()
+            if price is not None
+        ]
+
+    def get_latest_prices(
+        self, day: date, cumulative_version: int
+    ) -> Optional[list[PriceRow]]:
+        """Get the latest price of every pair up to a date if not changed since
+
+        `cumulative_version` is the sum of versions of all dates up to the date.
+        """
+        snapshot = self._get_snapshot()
+        if snapshot is None:
+            return
+        ordinal = day.toordinal()
+        with self._lock:
+            if any(changed <= ordinal for changed in self._changes):
+                return
+        if snapshot.cumulative_version(ordinal) != cumulative_version:
+            return
+        return [
+            PriceRow(sell_id, buy_id, _to_decimal(price))
+            for (sell_id, buy_id), price in snapshot.prices_on(
+                ordinal, latest=True
+            ).items()
+        ]
+
+    def get_pair_prices(
+        self,
+        sell_currency_id: int,
+        buy_currency_id: int,
+        start_date: date,
+        end_date: date,
+        versions: list[tuple[date, int]],
+    ) -> Optional[list[tuple[date, Decimal]]]:
+        """Get (date, price) of a pair if all dates of the range have `versions`"""
+        snapshot = self._get_snapshot()
+        if snapshot is None:
+            return
+        start, end = start_date.toordinal(), end_date.toordinal()
+        pair = (sell_currency_id, buy_currency_id)
+        with self._lock:
+            known_versions = snapshot.versions_between(start, end)
+            prices = snapshot.pair_prices(pair, start, end)
+            for ordinal, (version, changes) in self._changes.items():
+                if start <= ordinal <= end:
+                    known_versions[ordinal] = version
+                    if pair in changes:
+                        prices[ordinal] = changes[pair]
+        if known_versions != {day.toordinal(): version for day, version in versions}:
+            return
+        return [
+            (date.fromordinal(ordinal), _to_decimal(price))
+            for ordinal, price in sorted(prices.items())
+            if price is not None
+        ]
+
+    def apply_change(
+        self,
+        day: date,
+        version: int,
+        sell_currency_id: int,
+        buy_currency_id: int,
+        price: Optional[Decimal],
+    ):
+        """Apply price written with this process, None for a deleted one"""
+        snapshot = self._get_snapshot()
+        if snapshot is None:
+            return
+        ordinal = day.toordinal()
+        with self._lock:
+            change_version, changes = self._changes.get(ordinal, (None, {}))
+            if (change_version or snapshot.version(ordinal)) != version - 1:
+                # Missed changes of other processes, leave the date to the database
+                self._changes.pop(ordinal, None)
+                return
+            changes = dict(changes)
+            changes[(sell_currency_id, buy_currency_id)] = (
+                None if price is None else _to_scaled(price)
+            )
+            self._changes[ordinal] = (version, changes)
+
+    def _get_snapshot(self) -> Optional[PriceSnapshot]:
+        if self.path is None:
+            return
+        current_path = os.path.join(self.path, "current")
+        if not os.path.islink(current_path):
+            return
+        snapshot_path = os.path.realpath(current_path)
+        # Directory names are unique, unlike inodes of removed directories
+        snapshot_id = os.path.basename(snapshot_path)
+        if snapshot_id != self._snapshot_id:
+            try:
+                snapshot = PriceSnapshot.load(snapshot_path)
+            except FileNotFoundError:
+                # Replaced and removed by builds in the meantime, read from database
+                return
+            with self._lock:
+                self._snapshot = snapshot
+                self._snapshot_id = snapshot_id
+                self._changes = {}
+        return self._snapshot
+
+
+def build_snapshot(db_session, path: str) -> str:
+    """Write snapshot of all prices and make it current, returns its directory
+
+    Prices and their versions are only consistent when read in a REPEATABLE
+    READ transaction.
+    """
+    versions = np.array(
+        [
+            (day.toordinal(), version)
+            for day, version in db_session.query(
+                PriceDataVersion.date, PriceDataVersion.version
+            ).order_by(PriceDataVersion.date)
+        ],
+        dtype=VERSION_DTYPE,
+    )
+    row_count = db_session.query(func.count(ExchangePairPrice.id)).scalar()
+    keys = np.empty(row_count, dtype=np.int64)
+    prices = np.empty(row_count, dtype=np.int64)
+    pairs = []
+    rows = (
+        db_session.query(
+            ExchangePairPrice.sell_currency_id,
+            ExchangePairPrice.buy_currency_id,
+            ExchangePairPrice.date,
+            ExchangePairPrice.price,
+        )
+        .order_by(
+            ExchangePairPrice.sell_currency_id,
+            ExchangePairPrice.buy_currency_id,
+            ExchangePairPrice.date,
+        )
+        .yield_per(FETCH_SIZE)
+    )
+    for index, (sell_id, buy_id, day, price) in enumerate(rows):
+        if not pairs or pairs[-1] != (sell_id, buy_id):
+            pairs.append((sell_id, buy_id))
+        keys[index] = ((len(pairs) - 1) << 32) | day.toordinal()
+        prices[index] = _to_scaled(price)
+
+    snapshot = PriceSnapshot(keys, prices, np.array(pairs, dtype=PAIR_DTYPE), versions)
+    snapshot_path = os.path.join(path, f"snapshot-{time.time_ns()}")
+    snapshot.save(snapshot_path)
+    current_path = os.path.join(path, "current")
+    previous_path = (
+        os.path.realpath(current_path) if os.path.islink(current_path) else None
+    )
+    link_path = f"{current_path}.{os.getpid()}"
+    os.symlink(os.path.basename(snapshot_path), link_path)
+    os.replace(link_path, current_path)
+    # Previous snapshot is kept for processes that resolved `current` before it
+    # was switched, older ones are removed. Processes having mapped their files
+    # keep them until they switch.
+    kept = {os.path.basename(snapshot_path)}
+    if previous_path is not None:
+        kept.add(os.path.basename(previous_path))
+    for name in os.listdir(path):
+        if name.startswith("snapshot-") and name not in kept:
+            shutil.rmtree(os.path.join(path, name))
+    return snapshot_path
+
+
+def _to_scaled(price: Decimal) -> int:
+    # Rounded the way the database rounds values written to the price column
+    return int(price.scaleb(PRICE_SCALE).to_integral_value(ROUND_HALF_UP))
+
+
+def _to_decimal(scaled_price: int) -> Decimal:
+    return Decimal(scaled_price).scaleb(-PRICE_SCALE)
+
+
+price_store = PriceStore(PRICE_STORE_PATH)
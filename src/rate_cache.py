@@ -0,0 +1,87 @@
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Hashable, Optional
+
+from src.best_rate_matrix import BestRateMatrix
+
+RATE_GRAPH_CACHE_SIZE = int(os.environ.get("RATE_GRAPH_CACHE_SIZE", 32))
+
+
+class RateGraphCache:
+    """Process-level LRU cache of best rate matrices keyed by (date, version)
+
+    Best rates from the last known prices up to a date are keyed by
+    (date, "as_of", cumulative version). Prices written by any process bump
+    the version, so best rates of earlier versions are no longer looked up
+    and are left to be evicted.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._graphs = OrderedDict()
+        self._generation = 0
+        self._lock = Lock()
+
+    @property
+    def generation(self) -> int:
+        """Counter of clears, to tell if data read since is still cached"""
+        with self._lock:
+            return self._generation
+
+    def get(
+        self,
+        key: Hashable,
+        build: Callable[[], BestRateMatrix],
+        generation: Optional[int] = None,
+    ) -> BestRateMatrix:
+        """Get cached graph or build it, stored unless cleared meanwhile
+
+        `generation` of the cache when data of the graph was read defaults to
+        the current one.
+        """
+        with self._lock:
+            graph = self._graphs.get(key)
+            if graph is not None:
+                self._graphs.move_to_end(key)
+                self.hits += 1
+                return graph
+            self.misses += 1
+            if generation is None:
+                generation = self._generation
+        graph = build()
+        with self._lock:
+            # Do not store a graph built from currencies changed in the meantime
+            if generation == self._generation:
+                self._graphs[key] = graph
+                while len(self._graphs) > self.maxsize:
+                    self._graphs.popitem(last=False)
+        return graph
+
+    def peek(self, key: Hashable) -> Optional[BestRateMatrix]:
+        """Get cached graph without building it when missing"""
+        with self._lock:
+            graph = self._graphs.get(key)
+            if graph is not None:
+                self._graphs.move_to_end(key)
+                self.hits += 1
+            return graph
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._graphs.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._graphs),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+rate_graph_cache = RateGraphCache(maxsize=RATE_GRAPH_CACHE_SIZE)
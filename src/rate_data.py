@@ -0,0 +1,332 @@
+import itertools
+from datetime import date
+from decimal import Decimal
+from functools import partial
+from typing import Callable, Hashable, Iterable, Iterator, Optional
+
+from sqlalchemy import func, select, true, tuple_
+
+from src.best_rate_calculator import RateGraph
+from src.best_rate_matrix import BestRateMatrix
+from src.currency_registry import currency_registry
+from src.metrics import span
+from src.models_sqla import ExchangePairPrice, PriceDataVersion
+from src.price_store import price_store
+from src.rate_cache import rate_graph_cache
+from src.rate_executor import rate_executor
+
+# Precision of calculated best rates
+DECIMAL_PLACES = 4
+# Rows fetched at once when reading prices of a date range
+FETCH_SIZE = 1000
+
+# (date, sell code, buy code)
+RateKey = tuple[date, str, str]
+
+
+def get_best_rates(db_session, date: date, version: int = None) -> BestRateMatrix:
+    """Get best rates of a date, cached per process by version of its prices
+
+    `version` of prices of the date is looked up when not given.
+    """
+    if version is None:
+        version = get_data_version(db_session, date)
+    return rate_graph_cache.get(
+        (date, version), lambda: build_best_rates(db_session, date, version)
+    )
+
+
+def get_best_rates_by_key(
+    db_session, keys: Iterable[RateKey], with_paths: bool = False
+) -> dict:
+    """Get best rate, or (rate, path) `with_paths`, of (date, sell, buy) keys
+
+    Best rates are calculated in the rate executor when enabled, which raises
+    RateExecutorUnavailable when it cannot take or finish them in time.
+    """
+    pairs_by_date = {}
+    for day, sell_code, buy_code in keys:
+        pairs_by_date.setdefault(day, set()).add((sell_code, buy_code))
+    results = {}
+    for day, pairs in sorted(pairs_by_date.items()):
+        pairs = sorted(pairs)
+        version = get_data_version(db_session, day)
+        if rate_executor.enabled:
+            day_results = get_offloaded_best_rates(
+                (day, False, version),
+                partial(get_price_data, db_session, day, version),
+                pairs,
+                with_paths,
+            )
+        else:
+            best_rates = get_best_rates(db_session, day, version)
+            day_results = best_rates.best_rates_of_pairs(pairs, with_paths)
+        for (sell_code, buy_code), result in zip(pairs, day_results):
+            results[day, sell_code, buy_code] = result
+    return results
+
+
+def get_offloaded_best_rates(
+    key: Hashable,
+    get_data: Callable[[], list[tuple[str, str, Decimal]]],
+    pairs: list[tuple[str, str]],
+    with_paths: bool = False,
+) -> list:
+    """Get best rates of (sell code, buy code) pairs in the rate executor
+
+    `key` identifies the data read by `get_data`, e.g. (date, as_of, version).
+    """
+    # Best rates cached by workers refer to currencies by code
+    key = (*key, currency_registry.generation)
+    with span("rate_executor"):
+        return rate_executor.best_rates(
+            key, get_data, pairs, DECIMAL_PLACES, with_paths
+        )
+
+
+def build_best_rates(db_session, date: date, version: int = None) -> BestRateMatrix:
+    """Get best rates from prices of a date"""
+    return calculate_best_rates(get_price_data(db_session, date, version))
+
+
+def build_latest_best_rates(
+    db_session, date: date, cumulative_version: int = None
+) -> BestRateMatrix:
+    """Get best rates from the most recent price of every pair up to a date"""
+    return calculate_best_rates(
+        get_latest_price_data(db_session, date, cumulative_version)
+    )
+
+
+def calculate_best_rates(data: list[tuple[str, str, Decimal]]) -> BestRateMatrix:
+    with span("rate_graph"):
+        rate_graph = RateGraph(data, DECIMAL_PLACES)
+    with span("best_rate_matrix"):
+        return BestRateMatrix(rate_graph)
+
+
+def get_price_data(
+    db_session, date: date, version: int = None
+) -> list[tuple[str, str, Decimal]]:
+    """Get (sell code, buy code, price) of prices of a date
+
+    Prices are read from the price store when it holds `version` of them,
+    looked up when not given.
+    """
+    with span("price_rows"):
+        rows = None
+        if price_store.enabled:
+            if version is None:
+                version = get_data_version(db_session, date)
+            rows = price_store.get_prices(date, version)
+        if rows is None:
+            rows = db_session.query(
+                ExchangePairPrice.sell_currency_id,
+                ExchangePairPrice.buy_currency_id,
+                ExchangePairPrice.price,
+            ).filter_by(date=date)
+        return get_rate_data(db_session, rows)
+
+
+def get_latest_price_data(
+    db_session, date: date, cumulative_version: int = None
+) -> list[tuple[str, str, Decimal]]:
+    """Get (sell code, buy code, price) of the latest price of every pair
+
+    Prices are read from the price store when it holds `cumulative_version` of
+    them, looked up when not given.
+    """
+    with span("price_rows"):
+        rows = None
+        if price_store.enabled:
+            if cumulative_version is None:
+                cumulative_version = get_cumulative_data_version(db_session, date)
+            rows = price_store.get_latest_prices(date, cumulative_version)
+        if rows is None:
+            rows = get_latest_prices(db_session, date)
+        return get_rate_data(db_session, rows)
+
+
+def get_latest_prices(db_session, date: date):
+    """Query the most recent price of every pair of currencies up to a date
+
+    Pairs are enumerated by a recursive skip scan of the pair index and the
+    latest price of each pair is then a single index lookup, so prices of
+    earlier dates are not read.
+    """
+    sell_id = ExchangePairPrice.sell_currency_id
+    buy_id = ExchangePairPrice.buy_currency_id
+    pairs = get_price_pairs_cte()
+    latest_price = (
+        select(ExchangePairPrice.date, ExchangePairPrice.price)
+        .where(
+            sell_id == pairs.c.sell_currency_id,
+            buy_id == pairs.c.buy_currency_id,
+            ExchangePairPrice.date <= date,
+        )
+        .order_by(ExchangePairPrice.date.desc())
+        .limit(1)
+        .lateral()
+    )
+    return db_session.query(
+        pairs.c.sell_currency_id,
+        pairs.c.buy_currency_id,
+        latest_price.c.date,
+        latest_price.c.price,
+    ).select_from(pairs.join(latest_price, true()))
+
+
+def get_price_pairs_cte():
+    """Get CTE of (sell currency id, buy currency id) of every pair having prices
+
+    Pairs are enumerated by a recursive skip scan of the pair index, reading a
+    single index entry per pair.
+    """
+    sell_id = ExchangePairPrice.sell_currency_id
+    buy_id = ExchangePairPrice.buy_currency_id
+    pairs = (
+        select(sell_id, buy_id)
+        .order_by(sell_id, buy_id)
+        .limit(1)
+        .cte("pairs", recursive=True)
+    )
+    next_pair = (
+        select(sell_id, buy_id)
+        .where(
+            tuple_(sell_id, buy_id)
+            > tuple_(pairs.c.sell_currency_id, pairs.c.buy_currency_id)
+        )
+        .order_by(sell_id, buy_id)
+        .limit(1)
+        .lateral()
+    )
+    return pairs.union_all(
+        select(next_pair.c.sell_currency_id, next_pair.c.buy_currency_id).select_from(
+            pairs.join(next_pair, true())
+        )
+    )
+
+
+def iter_best_rates(
+    db_session, start_date: date, end_date: date
+) -> Iterator[tuple[date, BestRateMatrix]]:
+    """Get best rates of every date with prices in the range
+
+    Best rates of dates are taken from and added to the rate graph cache. When
+    calculated, the currency graph is reused between dates quoting the same
+    pairs, and best rates are reused between dates with the same prices.
+    """
+    # Best rates are not cached if currencies changed after they were read
+    generation = rate_graph_cache.generation
+    data = rate_graph = best_rates = None
+
+    def build(day_data: list[tuple[str, str, Decimal]]) -> BestRateMatrix:
+        nonlocal data, rate_graph, best_rates
+        if day_data != data:
+            data = day_data
+            with span("rate_graph"):
+                if rate_graph is None:
+                    rate_graph = RateGraph(data, DECIMAL_PLACES)
+                else:
+                    rate_graph = rate_graph.with_prices(data)
+            with span("best_rate_matrix"):
+                best_rates = BestRateMatrix(rate_graph)
+        return best_rates
+
+    for day, version, day_data in iter_price_data(db_session, start_date, end_date):
+        yield day, rate_graph_cache.get(
+            (day, version),
+            lambda: build(day_data),
+            generation=generation,
+        )
+
+
+def iter_pair_best_rates(
+    db_session, start_date: date, end_date: date, sell_code: str, buy_code: str
+) -> Iterator[tuple[date, Optional[Decimal]]]:
+    """Get best rate of a pair for every date with prices in the range
+
+    Best rates are calculated in the rate executor when enabled, which raises
+    RateExecutorUnavailable when it cannot take or finish them in time.
+    """
+    if not rate_executor.enabled:
+        for day, best_rates in iter_best_rates(db_session, start_date, end_date):
+            yield day, best_rates.best_rate(sell_code, buy_code)
+        return
+    for day, version, day_data in iter_price_data(db_session, start_date, end_date):
+        [best_rate] = get_offloaded_best_rates(
+            (day, False, version), partial(list, day_data), [(sell_code, buy_code)]
+        )
+        yield day, best_rate
+
+
+def iter_price_data(
+    db_session, start_date: date, end_date: date
+) -> Iterator[tuple[date, int, list[tuple[str, str, Decimal]]]]:
+    """Get date, version and (sell code, buy code, price) of dates of the range
+
+    Prices of the whole range are read with a single query.
+    """
+    # Read before prices, for prices never to be older than their version
+    versions = dict(get_data_versions(db_session, start_date, end_date))
+    query = (
+        db_session.query(
+            ExchangePairPrice.date,
+            ExchangePairPrice.sell_currency_id,
+            ExchangePairPrice.buy_currency_id,
+            ExchangePairPrice.price,
+        )
+        .filter(
+            ExchangePairPrice.date >= start_date,
+            ExchangePairPrice.date <= end_date,
+        )
+        .order_by(ExchangePairPrice.date)
+        .yield_per(FETCH_SIZE)
+    )
+    for day, rows in itertools.groupby(query, key=lambda row: row.date):
+        yield day, versions.get(day, 0), get_rate_data(db_session, rows)
+
+
+def get_data_version(db_session, date: date) -> int:
+    """Get version of prices of a date, 0 when they were never changed"""
+    version = db_session.query(PriceDataVersion.version).filter_by(date=date).scalar()
+    return version or 0
+
+
+def get_data_versions(
+    db_session, start_date: date, end_date: date
+) -> list[tuple[date, int]]:
+    """Get (date, version) of every date of the range with changed prices"""
+    return [
+        tuple(row)
+        for row in db_session.query(PriceDataVersion.date, PriceDataVersion.version)
+        .filter(
+            PriceDataVersion.date >= start_date,
+            PriceDataVersion.date <= end_date,
+        )
+        .order_by(PriceDataVersion.date)
+    ]
+
+
+def get_cumulative_data_version(db_session, date: date) -> int:
+    """Get a version changing with prices of any date up to the given one"""
+    # Versions only grow and are never deleted
+    return (
+        db_session.query(func.sum(PriceDataVersion.version))
+        .filter(PriceDataVersion.date <= date)
+        .scalar()
+        or 0
+    )
+
+
+def get_rate_data(db_session, rows) -> list[tuple[str, str, Decimal]]:
+    """Get (sell code, buy code, price) of price rows holding currency ids"""
+    # Sorted for graphs not to depend on the order rows are returned in
+    return sorted(
+        (
+            currency_registry.get_code(db_session, row.sell_currency_id),
+            currency_registry.get_code(db_session, row.buy_currency_id),
+            row.price,
+        )
+        for row in rows
+    )
@@ -0,0 +1,158 @@
+"""Best rate calculation offloaded to a pool of worker processes
+
+Building the currency graph and searching it holds the GIL, so on dense dates
+it stalls other requests of the same web worker. With `RATE_EXECUTOR_WORKERS`
+set, best rates are calculated and cached in the pool per key of the data,
+e.g. (date, version). Requests first ask the pool for cached best rates and
+only read and send prices when the worker has none, so workers may calculate
+the same date once each. Requests wait at most `RATE_EXECUTOR_TIMEOUT` seconds
+for results, and are rejected right away when `RATE_EXECUTOR_MAX_PENDING`
+calculations are already queued or running. Arbitrage checks need the whole
+best rate matrix of a date, so are not offloaded.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from decimal import Decimal
+from typing import Callable, Hashable
+
+from src.best_rate_calculator import RateGraph
+from src.best_rate_matrix import BestRateMatrix
+from src.rate_cache import RATE_GRAPH_CACHE_SIZE, RateGraphCache
+
+# Processes calculating best rates, calculated in request threads when 0
+RATE_EXECUTOR_WORKERS = int(os.environ.get("RATE_EXECUTOR_WORKERS", 0))
+RATE_EXECUTOR_TIMEOUT = float(os.environ.get("RATE_EXECUTOR_TIMEOUT", 5))
+RATE_EXECUTOR_MAX_PENDING = int(
+    os.environ.get("RATE_EXECUTOR_MAX_PENDING", 4 * RATE_EXECUTOR_WORKERS)
+)
+
+
+class RateExecutorUnavailable(Exception):
+    """Calculation was rejected or did not finish in time"""
+
+
+class RateExecutor:
+    def __init__(self, workers: int, timeout: float, max_pending: int):
+        self._pool = None
+        self._lock = threading.Lock()
+        self.configure(workers, timeout, max_pending)
+
+    def configure(self, workers: int, timeout: float, max_pending: int):
+        self.shutdown()
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending) if max_pending else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def best_rates(
+        self,
+        key: Hashable,
+        get_data: Callable[[], list[tuple[str, str, Decimal]]],
+        pairs: list[tuple[str, str]],
+        decimal_places: int,
+        with_paths: bool = False,
+    ) -> list:
+        """Get best rate of every (sell code, buy code) pair from prices data
+
+        `key` identifies the data, e.g. its date and version, for workers to
+        reuse best rates calculated from the same data before. `get_data` is
+        only called when the worker has none. With `with_paths` (rate, path)
+        of every pair is returned.
+        """
+        deadline = time.monotonic() + self.timeout
+        best_rates = self._run(deadline, _get_cached_best_rates, key, pairs, with_paths)
+        if best_rates is not None:
+            return best_rates
+        data = get_data()
+        codes = sorted({code for sell, buy, _ in data for code in (sell, buy)})
+        index_of_code = {code: index for index, code in enumerate(codes)}
+        # Currency codes are sent once, prices refer to them by index
+        edges = [
+            (index_of_code[sell], index_of_code[buy], price)
+            for sell, buy, price in data
+        ]
+        return self._run(
+            deadline,
+            _calculate_best_rates,
+            key,
+            codes,
+            edges,
+            pairs,
+            decimal_places,
+            with_paths,
+        )
+
+    def _run(self, deadline: float, fn: Callable, *args):
+        slots = self._slots
+        if slots is None or not slots.acquire(blocking=False):
+            raise RateExecutorUnavailable("Too many best rate calculations pending")
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        # Slot is only freed once the calculation is done, even if not waited for
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=max(0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            future.cancel()
+            raise RateExecutorUnavailable("Best rate calculation timed out")
+        except BrokenProcessPool:
+            # Worker died, e.g. killed for memory, a new pool is started next time
+            self.shutdown()
+            raise RateExecutorUnavailable("Best rate calculation failed")
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    self.workers,
+                    # Forked workers would share database connections of the app
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+
+# Best rates kept by a worker process
+_worker_cache = RateGraphCache(maxsize=RATE_GRAPH_CACHE_SIZE)
+
+
+def _get_cached_best_rates(key, pairs, with_paths):
+    best_rates = _worker_cache.peek(key)
+    if best_rates is None:
+        return None
+    return best_rates.best_rates_of_pairs(pairs, with_paths)
+
+
+def _calculate_best_rates(key, codes, edges, pairs, decimal_places, with_paths):
+    best_rates = _worker_cache.get(
+        key,
+        lambda: BestRateMatrix(
+            RateGraph(
+                [(codes[sell], codes[buy], price) for sell, buy, price in edges],
+                decimal_places,
+            )
+        ),
+    )
+    return best_rates.best_rates_of_pairs(pairs, with_paths)
+
+
+rate_executor = RateExecutor(
+    RATE_EXECUTOR_WORKERS, RATE_EXECUTOR_TIMEOUT, RATE_EXECUTOR_MAX_PENDING
+)
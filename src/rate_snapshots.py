@@ -0,0 +1,124 @@
+"""Best rates of every pair of currencies precalculated per date
+
+Snapshot of a date is fresh while it was calculated from the current version
+of prices of the date. Price writes bump the version, so only the dates they
+touched are recalculated by `refresh_snapshots`.
+"""
+import os
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.dialects.postgresql import insert
+
+from src.currency_registry import currency_registry
+from src.models_sqla import BestRateSnapshot, BestRateSnapshotDate, PriceDataVersion
+from src.rate_data import build_best_rates, get_data_version
+
+# First key of advisory locks serializing refreshes of the same date
+SNAPSHOT_LOCK_KEY = 17
+# Best rates are looked up in snapshots when set, for deployments refreshing them
+BEST_RATE_SNAPSHOTS = os.environ.get("BEST_RATE_SNAPSHOTS") == "1"
+
+
+def get_snapshot_rate(
+    db_session, date: date, version: int, sell_currency_id: int, buy_currency_id: int
+) -> tuple[bool, Optional[Decimal]]:
+    """Get best rate from the snapshot of a date if calculated from `version`
+
+    Returns whether the snapshot is fresh and the rate, None when currencies
+    are not connected. Snapshots are not looked up unless `BEST_RATE_SNAPSHOTS`
+    is set.
+    """
+    if not BEST_RATE_SNAPSHOTS:
+        return False, None
+    row = (
+        db_session.query(BestRateSnapshot.price)
+        .select_from(BestRateSnapshotDate)
+        .outerjoin(
+            BestRateSnapshot,
+            and_(
+                BestRateSnapshot.date == BestRateSnapshotDate.date,
+                BestRateSnapshot.sell_currency_id == sell_currency_id,
+                BestRateSnapshot.buy_currency_id == buy_currency_id,
+            ),
+        )
+        .filter(
+            BestRateSnapshotDate.date == date,
+            BestRateSnapshotDate.version == version,
+        )
+        .first()
+    )
+    if row is None:
+        return False, None
+    return True, row.price
+
+
+def get_stale_dates(db_session) -> list[date]:
+    """Get dates whose prices changed since their snapshot was calculated"""
+    query = (
+        db_session.query(PriceDataVersion.date)
+        .outerjoin(
+            BestRateSnapshotDate, BestRateSnapshotDate.date == PriceDataVersion.date
+        )
+        .filter(
+            or_(
+                BestRateSnapshotDate.version.is_(None),
+                BestRateSnapshotDate.version != PriceDataVersion.version,
+            )
+        )
+        .order_by(PriceDataVersion.date)
+    )
+    return [day for (day,) in query]
+
+
+def refresh_snapshots(db_session, dates: list[date] = None) -> list[date]:
+    """Recalculate snapshots of given or else all stale dates, returns the dates"""
+    if dates is None:
+        dates = get_stale_dates(db_session)
+    for day in dates:
+        refresh_snapshot(db_session, day)
+    return dates
+
+
+def refresh_snapshot(db_session, date: date):
+    """Recalculate best rates of all pairs of currencies of a date and commit them
+
+    Prices changed while calculating leave the snapshot stale, to be refreshed
+    again.
+    """
+    db_session.execute(
+        select(func.pg_advisory_xact_lock(SNAPSHOT_LOCK_KEY, date.toordinal()))
+    )
+    version = get_data_version(db_session, date)
+    best_rates = build_best_rates(db_session, date, version)
+    codes = list(best_rates.rate_graph.index_of_currency)
+    currency_ids = currency_registry.get_ids(db_session, codes)
+    rows = []
+    for sell_code in codes:
+        for buy_code in codes:
+            path = best_rates.best_path(sell_code, buy_code)
+            if path is None:
+                continue
+            rows.append(
+                {
+                    "date": date,
+                    "sell_currency_id": currency_ids[sell_code],
+                    "buy_currency_id": currency_ids[buy_code],
+                    "price": best_rates.best_rate(sell_code, buy_code),
+                    "path": [currency_ids[code] for code in path],
+                }
+            )
+    db_session.query(BestRateSnapshot).filter_by(date=date).delete(
+        synchronize_session=False
+    )
+    if rows:
+        db_session.execute(insert(BestRateSnapshot), rows)
+    statement = insert(BestRateSnapshotDate).values(date=date, version=version)
+    db_session.execute(
+        statement.on_conflict_do_update(
+            index_elements=["date"], set_={"version": statement.excluded.version}
+        )
+    )
+    db_session.commit()
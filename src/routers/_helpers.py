@@ -1,4 +1,13 @@
-from fastapi import HTTPException
+import hashlib
+import os
+from contextlib import contextmanager
+
+from fastapi import HTTPException, Request, Response, status
+
+from src.rate_executor import RateExecutorUnavailable
+
+# Seconds responses may be served by caches without revalidation
+HTTP_CACHE_MAX_AGE = int(os.environ.get("HTTP_CACHE_MAX_AGE", 60))
 
 
 def get_object_or_404(db_session, model_class, id):
@@ -10,3 +19,43 @@ def get_object_or_404(db_session, model_class, id):
         )
     else:
         return obj
+
+
+def get_etag(*parts) -> str:
+    """Strong entity tag of a response built from given parts"""
+    return '"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def get_cache_headers(etag: str) -> dict[str, str]:
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={HTTP_CACHE_MAX_AGE}",
+    }
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Whether the client already has the response tagged with `etag`"""
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is None:
+        return False
+    # If-None-Match uses weak comparison
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in tags or "*" in tags
+
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED, headers=get_cache_headers(etag)
+    )
+
+
+@contextmanager
+def rate_executor_errors():
+    """Answer with 503 when the rate executor cannot calculate best rates"""
+    try:
+        yield
+    except RateExecutorUnavailable as error:
+        # Rejected instead of queueing, for clients to retry later
+        raise HTTPException(
+            status_code=503, detail=str(error), headers={"Retry-After": "1"}
+        )
@@ -0,0 +1,84 @@
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Optional
+
+from fastapi import APIRouter, Depends, status
+from pydantic import BaseModel, condecimal
+
+from src.common import Error
+from src.currency_registry import currency_registry
+from src.deps import get_db
+from src.rate_data import DECIMAL_PLACES, get_best_rates_by_key
+
+from ._helpers import rate_executor_errors
+
+router = APIRouter()
+
+# Rounding amounts to significant digits like rates would lose whole units
+AMOUNT_QUANTUM = Decimal(1).scaleb(-DECIMAL_PLACES)
+# Bound of amounts, leaving room for their digits in the decimal precision
+MAX_AMOUNT = Decimal("1e15")
+
+
+class ConversionQuery(BaseModel):
+    amount: condecimal(gt=-MAX_AMOUNT, lt=MAX_AMOUNT)
+    sell: str
+    buy: str
+    date: date
+
+
+class ConversionResult(BaseModel):
+    amount: Optional[Decimal]
+    rate: Optional[Decimal]
+    path: Optional[list[str]]
+    error: Optional[str]
+
+
+@router.post(
+    "",
+    status_code=status.HTTP_200_OK,
+    response_model=list[ConversionResult],
+    responses={503: {"model": Error}},
+)
+def convert_amounts(queries: list[ConversionQuery], session=Depends(get_db)):
+    """Convert amounts at best rates of their dates
+
+    Best rate and path of every distinct pair and date are looked up once and
+    applied to all amounts exchanged between them. Currencies which are not
+    connected on the date get no `amount`. Amounts are rounded to 4 decimal
+    places, whereas rates are rounded to 4 significant digits.
+    """
+    requested_codes = {q.sell for q in queries} | {q.buy for q in queries}
+    existing_codes = currency_registry.get_ids(session, requested_codes).keys()
+    with rate_executor_errors():
+        rates = get_best_rates_by_key(
+            session,
+            (
+                (q.date, q.sell, q.buy)
+                for q in queries
+                if q.sell in existing_codes and q.buy in existing_codes
+            ),
+            with_paths=True,
+        )
+    results = []
+    for query in queries:
+        missing_code = next(
+            (c for c in (query.sell, query.buy) if c not in existing_codes), None
+        )
+        if missing_code is not None:
+            results.append(
+                ConversionResult(error=f"Currency '{missing_code}' does not exist")
+            )
+            continue
+        rate, path = rates[query.date, query.sell, query.buy]
+        if rate is None:
+            results.append(ConversionResult())
+            continue
+        try:
+            amount = (query.amount * rate).quantize(AMOUNT_QUANTUM)
+        except InvalidOperation:
+            # More digits than the decimal precision holds
+            results.append(ConversionResult(error="Converted amount is too large"))
+            continue
+        results.append(ConversionResult(amount=amount, rate=rate, path=path))
+    return results
@@ -2,8 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException, status
 
 from src.common import Error
 from src.crud_utils import create_currency
+from src.currency_registry import currency_registry
 from src.deps import get_db
 from src.models_sqla import Currency, ExchangePairPrice
+from src.rate_cache import rate_graph_cache
 from src.schemas import Currency_Pydantic, CurrencyIn_Pydantic
 
 from ._helpers import get_object_or_404
@@ -42,6 +44,9 @@ def update_currency(
     for field, value in currency.dict(exclude_unset=True).items():
         setattr(currency_obj, field, value)
     session.commit()
+    currency_registry.load(session)
+    # Cached rate graphs refer to currencies by code
+    rate_graph_cache.clear()
     return currency_obj
 
 
@@ -80,3 +85,11 @@ def delete_currency(currency_id: int, session=Depends(get_db)):
         )
     session.delete(currency)
     session.commit()
+    currency_registry.load(session)
+
+
+@router.post("/registry/reload", status_code=status.HTTP_204_NO_CONTENT)
+def reload_currency_registry(session=Depends(get_db)):
+    """Reload in-process currency codes, e.g. after changes made by other workers"""
+    currency_registry.load(session)
+    rate_graph_cache.clear()
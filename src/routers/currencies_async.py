@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy import select
+
+from src.deps import get_async_db
+from src.models_sqla import Currency
+from src.schemas import Currency_Pydantic
+
+router = APIRouter()
+
+
+@router.get("/", response_model=list[Currency_Pydantic])
+async def list_currency(session=Depends(get_async_db)):
+    result = await session.execute(select(Currency))
+    return result.scalars().all()
@@ -0,0 +1,96 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+
+from src.currency_registry import currency_registry
+from src.deps import get_db
+from src.live_rates import Subscriber, live_rates
+from src.rate_executor import RateExecutorUnavailable
+from src.routers.prices import BestRateQuery
+
+router = APIRouter()
+
+
+class LiveRequest(BaseModel):
+    subscribe: list[BestRateQuery] = []
+    unsubscribe: list[BestRateQuery] = []
+
+
+@router.websocket("/live")
+async def live_best_rates(websocket: WebSocket, session=Depends(get_db)):
+    """Push best rates of subscribed pairs whenever prices of their date change
+
+    Clients send `{"subscribe": [...], "unsubscribe": [...]}` messages listing
+    `sell`, `buy` and `date` of pairs, and receive `date`, `sell`, `buy` and
+    `price` of new subscriptions and of changed rates afterwards.
+    """
+    await websocket.accept()
+    subscriber = Subscriber(asyncio.get_running_loop())
+    sender = asyncio.create_task(_send_changes(websocket, subscriber))
+    try:
+        while True:
+            try:
+                request = LiveRequest.parse_obj(await websocket.receive_json())
+            except (ValidationError, ValueError) as error:
+                await websocket.send_json({"error": str(error)})
+                continue
+            live_rates.unsubscribe(
+                subscriber, {(q.date, q.sell, q.buy) for q in request.unsubscribe}
+            )
+            requested_codes = {q.sell for q in request.subscribe} | {
+                q.buy for q in request.subscribe
+            }
+            existing_codes = await run_in_threadpool(
+                _get_existing_codes, session, requested_codes
+            )
+            for code in sorted(requested_codes - existing_codes):
+                await websocket.send_json(
+                    {"error": f"Currency '{code}' does not exist"}
+                )
+            keys = {
+                (q.date, q.sell, q.buy)
+                for q in request.subscribe
+                if q.sell in existing_codes and q.buy in existing_codes
+            }
+            if keys:
+                live_rates.subscribe(subscriber, keys)
+                try:
+                    prices = await run_in_threadpool(_get_prices, session, keys)
+                except RateExecutorUnavailable as error:
+                    await websocket.send_json({"error": str(error)})
+                    continue
+                subscriber.push(prices)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        live_rates.disconnect(subscriber)
+
+
+async def _send_changes(websocket: WebSocket, subscriber: Subscriber):
+    while True:
+        changes = await subscriber.changes()
+        for (day, sell_code, buy_code), price in sorted(changes.items()):
+            await websocket.send_json(
+                {
+                    "date": day.isoformat(),
+                    "sell": sell_code,
+                    "buy": buy_code,
+                    "price": None if price is None else float(price),
+                }
+            )
+
+
+def _get_existing_codes(session, codes: set[str]) -> set[str]:
+    existing_codes = set(currency_registry.get_ids(session, codes))
+    # Connection is not held while the client stays connected
+    session.commit()
+    return existing_codes
+
+
+def _get_prices(session, keys: set) -> dict:
+    prices = live_rates.get_prices(session, keys)
+    session.commit()
+    return prices
@@ -1,31 +1,83 @@
+import base64
+import binascii
+import csv
+import json
 from datetime import date, timedelta
 from decimal import Decimal
-from typing import Optional
+from functools import partial
+from typing import Callable, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel, constr
-from sqlalchemy.orm import joinedload
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError, condecimal, constr
+from sqlalchemy import Integer, case, cast, func, tuple_
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg
 
-from src.best_rate_calculator import calculate_best_rate
+from src.best_rate_matrix import CYCLE_GAIN_TOLERANCE, BestRateMatrix
 from src.common import Error
-from src.deps import get_db
-from src.models_sqla import Currency, ExchangePairPrice
+from src.crud_utils import bump_data_versions, upsert_prices
+from src.currency_registry import currency_registry
+from src.deps import get_db, get_repeatable_read_db
+from src.live_rates import live_rates
+from src.models_sqla import ExchangePairPrice
+from src.price_export import iter_wide_csv
+from src.price_store import price_store
+from src.rate_cache import rate_graph_cache
+from src.rate_data import (
+    DECIMAL_PLACES,
+    calculate_best_rates,
+    get_best_rates,
+    get_best_rates_by_key,
+    get_cumulative_data_version,
+    get_data_version,
+    get_data_versions,
+    get_latest_price_data,
+    get_offloaded_best_rates,
+    get_price_data,
+    iter_best_rates,
+    iter_pair_best_rates,
+)
+from src.rate_executor import rate_executor
+from src.rate_snapshots import get_snapshot_rate
+
+from ._helpers import (
+    get_cache_headers,
+    get_etag,
+    is_not_modified,
+    not_modified,
+    rate_executor_errors,
+)
 
 router = APIRouter()
 
 
 currency_code = constr(max_length=3)
+# Rates are not defined for prices which are not positive
+price_value = condecimal(gt=0)
+
+# Rows fetched from the server-side cursor and written to the response at once
+STREAM_CHUNK_SIZE = 1000
 
 
 class PriceIn(BaseModel):
     date: date
     sell: str
     buy: str
-    value: Decimal
+    value: price_value
 
 
 class PriceUpdate(BaseModel):
-    value: Decimal
+    value: price_value
 
 
 class DatePrice(BaseModel):
@@ -40,19 +92,155 @@ class BestPrice(BaseModel):
     price: Optional[Decimal]
 
 
+class PriceAggregate(BaseModel):
+    start_date: date
+    open: Decimal
+    high: Decimal
+    low: Decimal
+    close: Decimal
+    mean: Decimal
+    count: int
+
+
+class DateBestPrice(BaseModel):
+    date: date
+    price: Optional[Decimal]
+
+
+class BestRateQuery(BaseModel):
+    sell: str
+    buy: str
+    date: date
+
+
+class BestRateResult(BaseModel):
+    price: Optional[Decimal]
+    error: Optional[str]
+
+
+class BulkPriceError(BaseModel):
+    line: int
+    detail: str
+
+
+class ArbitrageCycle(BaseModel):
+    path: list[str]
+    gain: Decimal
+
+
+class DateArbitrage(BaseModel):
+    date: date
+    cycles: list[ArbitrageCycle]
+
+
+class BulkPriceResult(BaseModel):
+    upserted: int
+    errors: list[BulkPriceError]
+    arbitrage: Optional[list[DateArbitrage]]
+
+
+class CacheStats(BaseModel):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+
+
+@router.get("/cache-stats", response_model=CacheStats)
+def get_cache_stats():
+    return rate_graph_cache.stats()
+
+
+@router.get(
+    "/arbitrage",
+    status_code=status.HTTP_200_OK,
+    response_model=list[DateArbitrage],
+)
+def find_arbitrage_in_range(
+    start_date: date = None,
+    end_date: date = None,
+    min_gain: float = Query(CYCLE_GAIN_TOLERANCE, gt=0),
+    session=Depends(get_db),
+):
+    """Get profitable exchange cycles for dates of the range having any"""
+    start_date, end_date = _get_start_end_dates(start_date, end_date)
+    result = []
+    for day, best_rates in iter_best_rates(session, start_date, end_date):
+        arbitrage = _get_arbitrage(day, best_rates, min_gain)
+        if arbitrage.cycles:
+            result.append(arbitrage)
+    return result
+
+
+@router.get(
+    "/export",
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"content": {"text/csv": {}}},
+        400: {"model": Error},
+    },
+)
+def export_prices(
+    start_date: date = None,
+    end_date: date = None,
+    pairs: list[str] = Query(None, regex="^[^/]{1,3}/[^/]{1,3}$"),
+    # Columns and prices must be read from the same state of the database
+    session=Depends(get_repeatable_read_db),
+):
+    """Stream prices as wide CSV in the format of the initial data import
+
+    Every pair having prices is exported unless `pairs` such as `EUR/USD` are
+    given, and dates are not limited unless `start_date` or `end_date` are.
+    """
+    pair_ids = None
+    if pairs:
+        pair_ids = []
+        for pair in pairs:
+            sell_currency_code, buy_currency_code = pair.split("/")
+            pair_ids.append(
+                (
+                    _get_currency_id(session, sell_currency_code),
+                    _get_currency_id(session, buy_currency_code),
+                )
+            )
+    return StreamingResponse(
+        iter_wide_csv(session, pair_ids, start_date, end_date),
+        media_type="text/csv",
+    )
+
+
+@router.get(
+    "/arbitrage/{date}",
+    status_code=status.HTTP_200_OK,
+    response_model=DateArbitrage,
+)
+def find_arbitrage(
+    date: date,
+    min_gain: float = Query(CYCLE_GAIN_TOLERANCE, gt=0),
+    session=Depends(get_db),
+):
+    """Get cycles of exchanges gaining at least `min_gain`, e.g. 0.001 for 0.1%
+
+    Such cycles are not possible with consistent prices and point to bad data.
+    """
+    return _get_arbitrage(date, get_best_rates(session, date), min_gain)
+
+
 @router.post(
     "/",
     status_code=status.HTTP_201_CREATED,
     responses={400: {"model": Error}},
 )
-def create_price(price: PriceIn, session=Depends(get_db)):
-    sell_currency = _get_currency_by_code(session, price.sell)
-    buy_currency = _get_currency_by_code(session, price.buy)
+def create_price(
+    price: PriceIn, background_tasks: BackgroundTasks, session=Depends(get_db)
+):
+    sell_currency_id = _get_currency_id(session, price.sell)
+    buy_currency_id = _get_currency_id(session, price.buy)
     if (
         session.query(ExchangePairPrice)
         .filter_by(
-            sell_currency=sell_currency,
-            buy_currency=buy_currency,
+            sell_currency_id=sell_currency_id,
+            buy_currency_id=buy_currency_id,
             date=price.date,
         )
         .first()
@@ -61,8 +249,8 @@ def create_price(price: PriceIn, session=Depends(get_db)):
     if (
         session.query(ExchangePairPrice)
         .filter_by(
-            sell_currency=buy_currency,
-            buy_currency=sell_currency,
+            sell_currency_id=buy_currency_id,
+            buy_currency_id=sell_currency_id,
             date=price.date,
         )
         .first()
@@ -70,12 +258,69 @@ def create_price(price: PriceIn, session=Depends(get_db)):
         raise HTTPException(status_code=400, detail="Price already exists")
     price_obj = ExchangePairPrice(
         date=price.date,
-        sell_currency=sell_currency,
-        buy_currency=buy_currency,
+        sell_currency_id=sell_currency_id,
+        buy_currency_id=buy_currency_id,
         price=price.value,
     )
     session.add(price_obj)
+    versions = bump_data_versions(session, [price.date])
     session.commit()
+    price_store.apply_change(
+        price.date,
+        versions[price.date],
+        sell_currency_id,
+        buy_currency_id,
+        price.value,
+    )
+    background_tasks.add_task(live_rates.publish, session, price.date)
+
+
+@router.post(
+    "/bulk",
+    status_code=status.HTTP_200_OK,
+    response_model=BulkPriceResult,
+    # `arbitrage` is only listed when checked
+    response_model_exclude_none=True,
+)
+async def bulk_upsert_prices(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    batch_size: int = 1000,
+    check_arbitrage: bool = False,
+    min_gain: float = Query(CYCLE_GAIN_TOLERANCE, gt=0),
+    session=Depends(get_db),
+):
+    """Create or update prices from a NDJSON or CSV (`text/csv`) request body
+
+    Every line holds the fields of a single price: `date`, `sell`, `buy` and
+    `value`. CSV body must start with a header line naming these fields.
+    Lines are validated as they arrive and written in batches of `batch_size`,
+    invalid lines, e.g. with a `value` which is not positive, are reported in
+    `errors` without failing the others. Lines
+    which are not UTF-8 or CSV rows with a different number of fields than
+    the header fail the request with 400, batches written before stay written.
+    With `check_arbitrage` dates receiving prices are checked for profitable
+    exchange cycles afterwards, the ones having any are listed in `arbitrage`.
+    """
+    result = BulkPriceResult(upserted=0, errors=[])
+    dates = set()
+    batch = []
+    async for line_number, price in _parse_price_lines(request, result.errors):
+        batch.append((line_number, price))
+        if len(batch) >= batch_size:
+            dates |= await run_in_threadpool(
+                _upsert_price_batch, session, batch, result
+            )
+            batch = []
+    if batch:
+        dates |= await run_in_threadpool(_upsert_price_batch, session, batch, result)
+    if check_arbitrage:
+        result.arbitrage = await run_in_threadpool(
+            _find_arbitrage_on_dates, session, sorted(dates), min_gain
+        )
+    for day in sorted(dates):
+        background_tasks.add_task(live_rates.publish, session, day)
+    return result
 
 
 @router.put(
@@ -88,15 +333,24 @@ def update_price(
     buy_currency_code: currency_code,
     date: date,
     price: PriceUpdate,
+    background_tasks: BackgroundTasks,
     session=Depends(get_db),
 ):
-    sell_currency = _get_currency_by_code(session, sell_currency_code)
-    buy_currency = _get_currency_by_code(session, buy_currency_code)
+    sell_currency_id = _get_currency_id(session, sell_currency_code)
+    buy_currency_id = _get_currency_id(session, buy_currency_code)
     price_record = _get_price_record(
-        session, date=date, sell_currency=sell_currency, buy_currency=buy_currency
+        session,
+        date=date,
+        sell_currency_id=sell_currency_id,
+        buy_currency_id=buy_currency_id,
     )
     price_record.price = price.value
+    versions = bump_data_versions(session, [date])
     session.commit()
+    price_store.apply_change(
+        date, versions[date], sell_currency_id, buy_currency_id, price.value
+    )
+    background_tasks.add_task(live_rates.publish, session, date)
 
 
 @router.delete(
@@ -108,15 +362,24 @@ def delete_price(
     sell_currency_code: currency_code,
     buy_currency_code: currency_code,
     date: date,
+    background_tasks: BackgroundTasks,
     session=Depends(get_db),
 ):
-    sell_currency = _get_currency_by_code(session, sell_currency_code)
-    buy_currency = _get_currency_by_code(session, buy_currency_code)
+    sell_currency_id = _get_currency_id(session, sell_currency_code)
+    buy_currency_id = _get_currency_id(session, buy_currency_code)
     price_record = _get_price_record(
-        session, date=date, sell_currency=sell_currency, buy_currency=buy_currency
+        session,
+        date=date,
+        sell_currency_id=sell_currency_id,
+        buy_currency_id=buy_currency_id,
     )
     session.delete(price_record)
+    versions = bump_data_versions(session, [date])
     session.commit()
+    price_store.apply_change(
+        date, versions[date], sell_currency_id, buy_currency_id, None
+    )
+    background_tasks.add_task(live_rates.publish, session, date)
 
 
 @router.get(
@@ -128,61 +391,365 @@ def delete_price(
 def get_historical_prices(
     sell_currency_code: currency_code,
     buy_currency_code: currency_code,
+    request: Request,
+    response: Response,
     start_date: date = None,
     end_date: date = None,
+    as_of: bool = False,
     session=Depends(get_db),
 ):
+    """Get prices of the range, with `as_of` the last known price of every date"""
     start_date, end_date = _get_start_end_dates(start_date, end_date)
     if (end_date - start_date).days > 180:
         raise HTTPException(
             status_code=400,
             detail="Interval must be shorter than 180 days",
         )
-    sell_currency = _get_currency_by_code(session, sell_currency_code)
-    buy_currency = _get_currency_by_code(session, buy_currency_code)
-    price_records = (
-        session.query(ExchangePairPrice)
+    sell_currency_id = _get_currency_id(session, sell_currency_code)
+    buy_currency_id = _get_currency_id(session, buy_currency_code)
+    if as_of:
+        # Price before the range is carried into it
+        versions = get_cumulative_data_version(session, end_date)
+    else:
+        versions = get_data_versions(session, start_date, end_date)
+    etag = get_etag(
+        sell_currency_id, buy_currency_id, start_date, end_date, as_of, versions
+    )
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers.update(get_cache_headers(etag))
+    if not as_of:
+        stored_prices = price_store.get_pair_prices(
+            sell_currency_id, buy_currency_id, start_date, end_date, versions
+        )
+        if stored_prices is not None:
+            return [DatePrice(date=day, price=price) for day, price in stored_prices]
+    pair_prices = session.query(ExchangePairPrice).filter(
+        ExchangePairPrice.sell_currency_id == sell_currency_id,
+        ExchangePairPrice.buy_currency_id == buy_currency_id,
+    )
+    price_records = pair_prices.filter(
+        ExchangePairPrice.date >= start_date,
+        ExchangePairPrice.date <= end_date,
+    ).order_by(ExchangePairPrice.date)
+    if as_of:
+        previous_record = (
+            pair_prices.filter(ExchangePairPrice.date < start_date)
+            .order_by(ExchangePairPrice.date.desc())
+            .first()
+        )
+        return _get_daily_prices(start_date, end_date, previous_record, price_records)
+    return [DatePrice.from_orm(item) for item in price_records]
+
+
+@router.get(
+    "/{sell_currency_code}/{buy_currency_code}/history",
+    status_code=status.HTTP_200_OK,
+    response_model=list[DatePrice],
+    responses={
+        200: {"content": {"text/csv": {}}},
+        400: {"model": Error},
+    },
+)
+def stream_historical_prices(
+    sell_currency_code: currency_code,
+    buy_currency_code: currency_code,
+    request: Request,
+    start_date: date = None,
+    end_date: date = None,
+    cursor: str = None,
+    limit: int = Query(None, gt=0),
+    format: str = Query("json", regex="^(json|csv)$"),
+    session=Depends(get_db),
+):
+    """Stream prices of any date range, optionally paginated
+
+    When `limit` is given and more prices follow, the `X-Next-Cursor` header
+    holds the `cursor` value to request the next page with.
+    """
+    start_date, end_date = _get_start_end_dates(start_date, end_date)
+    if cursor is not None:
+        start_date = _decode_cursor(cursor)
+    sell_currency_id = _get_currency_id(session, sell_currency_code)
+    buy_currency_id = _get_currency_id(session, buy_currency_code)
+    etag = get_etag(
+        sell_currency_id,
+        buy_currency_id,
+        start_date,
+        end_date,
+        limit,
+        format,
+        get_data_versions(session, start_date, end_date),
+    )
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    query = session.query(ExchangePairPrice.date, ExchangePairPrice.price).filter(
+        ExchangePairPrice.sell_currency_id == sell_currency_id,
+        ExchangePairPrice.buy_currency_id == buy_currency_id,
+        ExchangePairPrice.date >= start_date,
+        ExchangePairPrice.date <= end_date,
+    )
+    headers = get_cache_headers(etag)
+    if limit is not None:
+        next_date = (
+            query.with_entities(ExchangePairPrice.date)
+            .order_by(ExchangePairPrice.date)
+            .offset(limit)
+            .limit(1)
+            .scalar()
+        )
+        if next_date is not None:
+            headers["X-Next-Cursor"] = _encode_cursor(next_date)
+            query = query.filter(ExchangePairPrice.date < next_date)
+    rows = query.order_by(ExchangePairPrice.date).yield_per(STREAM_CHUNK_SIZE)
+    if format == "csv":
+        return StreamingResponse(
+            _stream_csv(rows), media_type="text/csv", headers=headers
+        )
+    return StreamingResponse(
+        _stream_json(rows), media_type="application/json", headers=headers
+    )
+
+
+@router.get(
+    "/{sell_currency_code}/{buy_currency_code}/aggregate",
+    status_code=status.HTTP_200_OK,
+    response_model=list[PriceAggregate],
+    responses={400: {"model": Error}},
+)
+def aggregate_prices(
+    sell_currency_code: currency_code,
+    buy_currency_code: currency_code,
+    start_date: date = None,
+    end_date: date = None,
+    period: str = Query("week", regex="^(week|month)$"),
+    bucket_days: int = Query(None, gt=0),
+    session=Depends(get_db),
+):
+    """Get open, high, low, close and mean price per week, month or custom bucket
+
+    Buckets of `bucket_days` days counted from `start_date` take precedence
+    over `period`. Prices stored for the reverse pair are inverted, rounded to
+    4 significant digits like by the best rate endpoint.
+    """
+    start_date, end_date = _get_start_end_dates(start_date, end_date)
+    sell_currency_id = _get_currency_id(session, sell_currency_code)
+    buy_currency_id = _get_currency_id(session, buy_currency_code)
+    is_direct = ExchangePairPrice.sell_currency_id == sell_currency_id
+    rates = (
+        session.query(
+            ExchangePairPrice.date.label("date"),
+            case(
+                (is_direct, ExchangePairPrice.price),
+                else_=_get_inverse_price(ExchangePairPrice.price),
+            ).label("rate"),
+        )
         .filter(
-            ExchangePairPrice.sell_currency == sell_currency,
-            ExchangePairPrice.buy_currency == buy_currency,
+            tuple_(
+                ExchangePairPrice.sell_currency_id, ExchangePairPrice.buy_currency_id
+            ).in_(
+                [
+                    (sell_currency_id, buy_currency_id),
+                    (buy_currency_id, sell_currency_id),
+                ]
+            ),
             ExchangePairPrice.date >= start_date,
             ExchangePairPrice.date <= end_date,
         )
-        .order_by(ExchangePairPrice.date)
+        # Single price per date, the directly stored one when both exist
+        .distinct(ExchangePairPrice.date)
+        .order_by(ExchangePairPrice.date, is_direct.desc())
+        .subquery()
     )
-    return [DatePrice.from_orm(item) for item in price_records]
+    if bucket_days is not None:
+        bucket = rates.c.date - cast((rates.c.date - start_date) % bucket_days, Integer)
+    else:
+        bucket = cast(func.date_trunc(period, rates.c.date), rates.c.date.type)
+    bucket = bucket.label("start_date")
+    aggregates = (
+        session.query(
+            bucket,
+            array_agg(aggregate_order_by(rates.c.rate, rates.c.date))[1].label("open"),
+            func.max(rates.c.rate).label("high"),
+            func.min(rates.c.rate).label("low"),
+            array_agg(aggregate_order_by(rates.c.rate, rates.c.date.desc()))[1].label(
+                "close"
+            ),
+            func.round(func.avg(rates.c.rate), 4).label("mean"),
+            func.count().label("count"),
+        )
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+    return [PriceAggregate(**row._asdict()) for row in aggregates]
+
+
+@router.get(
+    "/{sell_currency_code}/{buy_currency_code}/best-series",
+    status_code=status.HTTP_200_OK,
+    response_model=list[DateBestPrice],
+    responses={400: {"model": Error}, 503: {"model": Error}},
+)
+def get_best_rate_series(
+    sell_currency_code: currency_code,
+    buy_currency_code: currency_code,
+    start_date: date = None,
+    end_date: date = None,
+    session=Depends(get_db),
+):
+    """Get best rate for every date with prices in the range
+
+    Rates are the same as returned by the best rate endpoint for each date.
+    """
+    start_date, end_date = _get_start_end_dates(start_date, end_date)
+    # Validate currency codes
+    _get_currency_id(session, sell_currency_code)
+    _get_currency_id(session, buy_currency_code)
+    with rate_executor_errors():
+        return [
+            DateBestPrice(date=day, price=price)
+            for day, price in iter_pair_best_rates(
+                session, start_date, end_date, sell_currency_code, buy_currency_code
+            )
+        ]
 
 
 @router.get(
     "/{sell_currency_code}/{buy_currency_code}/{date}",
     status_code=status.HTTP_200_OK,
     response_model=BestPrice,
-    responses={400: {"model": Error}},
+    responses={400: {"model": Error}, 503: {"model": Error}},
 )
 def get_rate(
     sell_currency_code: currency_code,
     buy_currency_code: currency_code,
     date: date,
+    request: Request,
+    response: Response,
+    as_of: bool = False,
     session=Depends(get_db),
 ):
-    # Validate currency codes
-    _get_currency_by_code(session, sell_currency_code)
-    _get_currency_by_code(session, buy_currency_code)
-    query = (
-        session.query(ExchangePairPrice)
-        .filter_by(date=date)
-        .options(
-            joinedload(ExchangePairPrice.buy_currency),
-            joinedload(ExchangePairPrice.sell_currency),
-        )
+    """Get best rate of a date, with `as_of` from the last known price of every pair
+
+    Without `as_of` only prices of the date itself are used.
+    """
+    version, result = _check_rate(
+        session, sell_currency_code, buy_currency_code, date, request, response, as_of
+    )
+    if result is not None:
+        return result
+    get_data = get_latest_price_data if as_of else get_price_data
+    best_rate = _calculate_best_rate(
+        partial(get_data, session, date, version),
+        date,
+        version,
+        as_of,
+        sell_currency_code,
+        buy_currency_code,
     )
-    data = [
-        (item.sell_currency.code, item.buy_currency.code, item.price) for item in query
-    ]
-    best_rate = calculate_best_rate(sell_currency_code, buy_currency_code, data, 4)
     return BestPrice(price=best_rate)
 
 
+@router.post(
+    "/best-rates",
+    status_code=status.HTTP_200_OK,
+    response_model=list[BestRateResult],
+    responses={503: {"model": Error}},
+)
+def get_batch_best_rates(queries: list[BestRateQuery], session=Depends(get_db)):
+    requested_codes = {q.sell for q in queries} | {q.buy for q in queries}
+    existing_codes = currency_registry.get_ids(session, requested_codes).keys()
+    with rate_executor_errors():
+        best_rates = get_best_rates_by_key(
+            session,
+            (
+                (q.date, q.sell, q.buy)
+                for q in queries
+                if q.sell in existing_codes and q.buy in existing_codes
+            ),
+        )
+    results = []
+    for query in queries:
+        missing_code = next(
+            (c for c in (query.sell, query.buy) if c not in existing_codes), None
+        )
+        if missing_code is not None:
+            results.append(
+                BestRateResult(error=f"Currency '{missing_code}' does not exist")
+            )
+            continue
+        best_rate = best_rates[query.date, query.sell, query.buy]
+        results.append(BestRateResult(price=best_rate))
+    return results
+
+
+def _check_rate(
+    session,
+    sell_code: str,
+    buy_code: str,
+    date: date,
+    request: Request,
+    response: Response,
+    as_of: bool,
+) -> tuple[int, Union[Response, BestPrice, None]]:
+    """Get version of prices of a rate and the response if known without them
+
+    That is when the client already has the current rate, or a fresh snapshot
+    holds it.
+    """
+    sell_currency_id = _get_currency_id(session, sell_code)
+    buy_currency_id = _get_currency_id(session, buy_code)
+    if as_of:
+        version = get_cumulative_data_version(session, date)
+    else:
+        version = get_data_version(session, date)
+    etag = get_etag(sell_currency_id, buy_currency_id, date, as_of, version)
+    if is_not_modified(request, etag):
+        return version, not_modified(etag)
+    response.headers.update(get_cache_headers(etag))
+    if not as_of:
+        is_fresh, best_rate = get_snapshot_rate(
+            session, date, version, sell_currency_id, buy_currency_id
+        )
+        if is_fresh:
+            return version, BestPrice(price=best_rate)
+    return version, None
+
+
+def _calculate_best_rate(
+    read_data: Callable[[], list[tuple[str, str, Decimal]]],
+    date: date,
+    version: int,
+    as_of: bool,
+    sell_code: str,
+    buy_code: str,
+) -> Optional[Decimal]:
+    """Get best rate from prices of the given version, in the rate executor if set
+
+    Prices are only read with `read_data` when best rates are not cached.
+    """
+    if rate_executor.enabled:
+        with rate_executor_errors():
+            [best_rate] = get_offloaded_best_rates(
+                (date, as_of, version), read_data, [(sell_code, buy_code)]
+            )
+        return best_rate
+    # Last known prices change with prices of any earlier date
+    key = (date, "as_of", version) if as_of else (date, version)
+    best_rates = rate_graph_cache.get(key, lambda: calculate_best_rates(read_data()))
+    return best_rates.best_rate(sell_code, buy_code)
+
+
+def _get_inverse_price(price):
+    """SQL expression of 1 / price rounded like inverse prices of rate graphs
+
+    That is to `DECIMAL_PLACES` significant digits, rather than decimal places.
+    """
+    inverse = 1 / price
+    digits = DECIMAL_PLACES - 1 - cast(func.floor(func.log(inverse)), Integer)
+    return func.round(inverse, digits)
+
+
 def _get_start_end_dates(start=None, end=None):
     if start is None and end is None:
         end_date = date.today()
@@ -199,21 +766,220 @@ def _get_start_end_dates(start=None, end=None):
     return start_date, end_date
 
 
-def _get_currency_by_code(db_session, code: str):
-    currency = db_session.query(Currency).filter_by(code=code).first()
-    if currency is None:
+def _get_daily_prices(
+    start_date: date, end_date: date, previous_record, price_records
+) -> list[DatePrice]:
+    """Get price of every date of the range, the last one stored up to the date"""
+    prices = {item.date: item.price for item in price_records}
+    price = previous_record.price if previous_record is not None else None
+    result = []
+    day = start_date
+    while day <= end_date:
+        price = prices.get(day, price)
+        if price is not None:
+            result.append(DatePrice(date=day, price=price))
+        day += timedelta(days=1)
+    return result
+
+
+def _encode_cursor(next_date: date) -> str:
+    return base64.urlsafe_b64encode(next_date.isoformat().encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> date:
+    try:
+        return date.fromisoformat(base64.urlsafe_b64decode(cursor).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _chunks(rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == STREAM_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _stream_json(rows):
+    separator = "["
+    for chunk in _chunks(rows):
+        yield separator + ",".join(
+            json.dumps({"date": row.date.isoformat(), "price": float(row.price)})
+            for row in chunk
+        )
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
+def _stream_csv(rows):
+    yield "date,price\n"
+    for chunk in _chunks(rows):
+        yield "".join(f"{row.date.isoformat()},{row.price}\n" for row in chunk)
+
+
+async def _read_lines(request: Request):
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+async def _parse_price_lines(request: Request, errors: list[BulkPriceError]):
+    is_csv = request.headers.get("content-type", "").startswith("text/csv")
+    header = None
+    line_number = 0
+    async for raw_line in _read_lines(request):
+        line_number += 1
+        try:
+            line = raw_line.decode()
+        except UnicodeDecodeError:
+            raise HTTPException(
+                status_code=400, detail=f"Line {line_number} is not valid UTF-8"
+            )
+        if not line.strip():
+            continue
+        try:
+            if not is_csv:
+                price = PriceIn.parse_raw(line)
+            elif header is None:
+                header = next(csv.reader([line]))
+                continue
+            else:
+                row = next(csv.reader([line]))
+                if len(row) != len(header):
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Line {line_number} has {len(row)} fields, "
+                        f"header has {len(header)}",
+                    )
+                price = PriceIn(**dict(zip(header, row)))
+        except ValidationError as e:
+            errors.append(BulkPriceError(line=line_number, detail=str(e)))
+            continue
+        yield line_number, price
+
+
+def _upsert_price_batch(
+    db_session,
+    batch: list[tuple[int, PriceIn]],
+    result: BulkPriceResult,
+):
+    codes = {code for _, price in batch for code in (price.sell, price.buy)}
+    currency_ids = currency_registry.get_ids(db_session, codes)
+
+    lines = {}
+    values = {}
+    for line_number, price in batch:
+        missing_code = next(
+            (c for c in (price.sell, price.buy) if c not in currency_ids), None
+        )
+        if missing_code is not None:
+            result.errors.append(
+                BulkPriceError(
+                    line=line_number,
+                    detail=f"Currency '{missing_code}' does not exist",
+                )
+            )
+            continue
+        key = (price.date, currency_ids[price.sell], currency_ids[price.buy])
+        if (key[0], key[2], key[1]) in values:
+            result.errors.append(
+                BulkPriceError(line=line_number, detail="Price already exists")
+            )
+            continue
+        lines[key] = line_number
+        values[key] = price.value
+
+    if values:
+        # Prices already stored in the opposite direction, checked for whole batch
+        reversed_prices = db_session.query(
+            ExchangePairPrice.date,
+            ExchangePairPrice.sell_currency_id,
+            ExchangePairPrice.buy_currency_id,
+        ).filter(
+            tuple_(
+                ExchangePairPrice.date,
+                ExchangePairPrice.sell_currency_id,
+                ExchangePairPrice.buy_currency_id,
+            ).in_([(date, buy_id, sell_id) for date, sell_id, buy_id in values])
+        )
+        for day, sell_id, buy_id in reversed_prices:
+            key = (day, buy_id, sell_id)
+            result.errors.append(
+                BulkPriceError(line=lines.pop(key), detail="Price already exists")
+            )
+            del values[key]
+
+    dates = set()
+    if values:
+        dates = upsert_prices(
+            db_session,
+            [
+                {
+                    "date": date,
+                    "sell_currency_id": sell_id,
+                    "buy_currency_id": buy_id,
+                    "price": price,
+                }
+                for (date, sell_id, buy_id), price in values.items()
+            ],
+        )
+        db_session.commit()
+    result.upserted += len(values)
+    result.errors.sort(key=lambda error: error.line)
+    return dates
+
+
+def _find_arbitrage_on_dates(
+    db_session, dates: list[date], min_gain: float
+) -> list[DateArbitrage]:
+    result = []
+    for day in dates:
+        arbitrage = _get_arbitrage(day, get_best_rates(db_session, day), min_gain)
+        if arbitrage.cycles:
+            result.append(arbitrage)
+    return result
+
+
+def _get_arbitrage(
+    date: date, best_rates: BestRateMatrix, min_gain: float
+) -> DateArbitrage:
+    return DateArbitrage(
+        date=date,
+        cycles=[
+            ArbitrageCycle(path=path, gain=gain)
+            for path, gain in best_rates.arbitrage_cycles(min_gain)
+        ],
+    )
+
+
+def _get_currency_id(db_session, code: str) -> int:
+    currency_id = currency_registry.get_id(db_session, code)
+    if currency_id is None:
         raise HTTPException(
             status_code=400,
             detail=f"Currency '{code}' does not exist",
         )
     else:
-        return currency
+        return currency_id
 
 
-def _get_price_record(db_session, date, sell_currency, buy_currency):
+def _get_price_record(db_session, date, sell_currency_id, buy_currency_id):
     price_record = (
         db_session.query(ExchangePairPrice)
-        .filter_by(date=date, sell_currency=sell_currency, buy_currency=buy_currency)
+        .filter_by(
+            date=date,
+            sell_currency_id=sell_currency_id,
+            buy_currency_id=buy_currency_id,
+        )
         .first()
     )
     if price_record is None:
@@ -0,0 +1,96 @@
+"""Async variants of read-only price endpoints
+
+Handlers run the same code as their sync counterparts in `src.routers.prices`,
+so responses are identical. Database reads go through `AsyncSession.run_sync`
+on the event loop, while best rates are calculated, or waited for in the rate
+executor, in the thread pool for other requests not to be held up meanwhile.
+"""
+from datetime import date
+
+from anyio import from_thread
+from fastapi import APIRouter, Depends, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+
+from src.common import Error
+from src.deps import get_async_db
+from src.rate_data import get_latest_price_data, get_price_data
+
+from . import prices
+
+router = APIRouter()
+
+
+@router.get(
+    "/{sell_currency_code}/{buy_currency_code}",
+    status_code=status.HTTP_200_OK,
+    response_model=list[prices.DatePrice],
+    responses={400: {"model": Error}},
+)
+async def get_historical_prices(
+    sell_currency_code: prices.currency_code,
+    buy_currency_code: prices.currency_code,
+    request: Request,
+    response: Response,
+    start_date: date = None,
+    end_date: date = None,
+    as_of: bool = False,
+    session=Depends(get_async_db),
+):
+    return await session.run_sync(
+        lambda sync_session: prices.get_historical_prices(
+            sell_currency_code,
+            buy_currency_code,
+            request,
+            response,
+            start_date=start_date,
+            end_date=end_date,
+            as_of=as_of,
+            session=sync_session,
+        )
+    )
+
+
+@router.get(
+    "/{sell_currency_code}/{buy_currency_code}/{date}",
+    status_code=status.HTTP_200_OK,
+    response_model=prices.BestPrice,
+    responses={400: {"model": Error}},
+)
+async def get_rate(
+    sell_currency_code: prices.currency_code,
+    buy_currency_code: prices.currency_code,
+    date: date,
+    request: Request,
+    response: Response,
+    as_of: bool = False,
+    session=Depends(get_async_db),
+):
+    version, result = await session.run_sync(
+        lambda sync_session: prices._check_rate(
+            sync_session,
+            sell_currency_code,
+            buy_currency_code,
+            date,
+            request,
+            response,
+            as_of,
+        )
+    )
+    if result is not None:
+        return result
+    get_data = get_latest_price_data if as_of else get_price_data
+
+    def read_data():
+        # Called from the thread pool, prices are read on the event loop
+        return from_thread.run(session.run_sync, get_data, date, version)
+
+    best_rate = await run_in_threadpool(
+        prices._calculate_best_rate,
+        read_data,
+        date,
+        version,
+        as_of,
+        sell_currency_code,
+        buy_currency_code,
+    )
+    return prices.BestPrice(price=best_rate)
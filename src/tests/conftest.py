@@ -3,15 +3,19 @@ import os
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
 from sqlalchemy_utils import create_database, database_exists
 
-from src.app import app
-from src.deps import get_db
+from src.app import app, use_async_routes
+from src.currency_registry import currency_registry
+from src.deps import get_async_db, get_db, get_repeatable_read_db
+from src.rate_cache import rate_graph_cache
 from src.sqla_base import Base
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def engine():
     test_db_url = os.environ["SQLALCHEMY_DATABASE_URL"] + "_test"
     if not database_exists(test_db_url):
@@ -21,6 +25,21 @@ def engine():
     return engine
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # Test data is rolled back after every test, so must be the cached state
+    _clear_caches()
+    yield
+    _clear_caches()
+
+
+def _clear_caches():
+    rate_graph_cache.clear()
+    # Tests check statistics of their own requests only
+    rate_graph_cache.hits = rate_graph_cache.misses = 0
+    currency_registry.clear()
+
+
 @pytest.fixture
 def db(engine):
     connection = engine.connect()
@@ -36,5 +55,45 @@ def db(engine):
 @pytest.fixture
 def client(db):
     app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_repeatable_read_db] = lambda: db
     with TestClient(app) as c:
         yield c
+
+
+@pytest.fixture
+def committed_db(engine):
+    """Session committing test data, for clients reading with other connections"""
+    db = Session(bind=engine)
+    yield db
+    db.close()
+    with engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(table.delete())
+
+
+@pytest.fixture
+def async_client(engine, committed_db):
+    """Client of the app serving read endpoints with the async database driver"""
+    # Connections are not reused by event loops of other clients
+    async_engine = create_async_engine(
+        engine.url.set(drivername="postgresql+asyncpg"), poolclass=NullPool
+    )
+    async_session = sessionmaker(
+        bind=async_engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async def get_test_async_db():
+        async with async_session() as session:
+            yield session
+
+    routes = list(app.router.routes)
+    use_async_routes()
+    app.dependency_overrides[get_db] = lambda: committed_db
+    app.dependency_overrides[get_repeatable_read_db] = lambda: committed_db
+    app.dependency_overrides[get_async_db] = get_test_async_db
+    try:
+        with TestClient(app) as c:
+            yield c
+    finally:
+        app.router.routes[:] = routes
+        del app.dependency_overrides[get_async_db]
@@ -0,0 +1,38 @@
+import pytest
+
+from src.app import app
+from src.routers import currencies_async, prices_async
+from src.tests import test_currency_endpoints, test_price_endpoints
+
+
+def test_async_routes_replace_sync_routes(async_client):
+    endpoints = {
+        route.path: route.endpoint
+        for route in app.router.routes
+        if "GET" in getattr(route, "methods", ())
+    }
+    assert endpoints["/currencies/"] is currencies_async.list_currency
+    assert endpoints["/prices/{sell_currency_code}/{buy_currency_code}"] is (
+        prices_async.get_historical_prices
+    )
+    assert endpoints["/prices/{sell_currency_code}/{buy_currency_code}/{date}"] is (
+        prices_async.get_rate
+    )
+
+
+@pytest.mark.parametrize(
+    "test",
+    [
+        test_currency_endpoints.test_list_currencies,
+        test_price_endpoints.test_historical_prices,
+        test_price_endpoints.test_historical_prices_conditional,
+        test_price_endpoints.test_historical_prices_as_of,
+        test_price_endpoints.test_get_rate,
+        test_price_endpoints.test_get_rate_uses_cached_graph,
+        test_price_endpoints.test_get_rate_conditional,
+        test_price_endpoints.test_get_rate_as_of,
+    ],
+    ids=lambda test: test.__name__,
+)
+def test_async_routes_respond_as_sync_routes(test, async_client, committed_db):
+    test(async_client, committed_db)
@@ -0,0 +1,77 @@
+from decimal import Decimal
+
+from src.best_rate_calculator import RateGraph, calculate_best_rate
+from src.best_rate_matrix import BestRateMatrix
+
+
+def test_best_rate_matches_calculator_without_alternative_paths():
+    data = [
+        ["AUD", "USD", Decimal("0.78")],
+        ["NZD", "USD", Decimal("0.69")],
+    ]
+    best_rates = BestRateMatrix(RateGraph(data, 4))
+    for sell, buy in [("AUD", "NZD"), ("NZD", "AUD"), ("USD", "AUD")]:
+        assert best_rates.best_rate(sell, buy) == calculate_best_rate(
+            sell, buy, data, 4
+        )
+    assert best_rates.best_path("AUD", "NZD") == ["AUD", "USD", "NZD"]
+
+
+def test_best_rate_prefers_better_price_over_fewer_hops():
+    data = [
+        ["EUR", "USD", Decimal("1.2")],
+        ["USD", "CAD", Decimal("1.3")],
+        ["EUR", "CAD", Decimal("1.5")],
+    ]
+    best_rates = BestRateMatrix(RateGraph(data, 4))
+    assert best_rates.best_path("EUR", "CAD") == ["EUR", "USD", "CAD"]
+    assert best_rates.best_rate("EUR", "CAD") == Decimal("1.56")
+    assert calculate_best_rate("EUR", "CAD", data, 4) == Decimal("1.5")
+
+
+def test_best_rate_unknown_or_disconnected_currencies():
+    data = [
+        ["EUR", "USD", Decimal("1.2")],
+        ["GBP", "JPY", Decimal("150")],
+    ]
+    best_rates = BestRateMatrix(RateGraph(data, 4))
+    assert best_rates.best_rate("EUR", "JPY") is None
+    assert best_rates.best_rate("EUR", "CHF") is None
+
+
+def test_arbitrage_cycles():
+    data = [
+        ["EUR", "USD", Decimal("1.2")],
+        ["USD", "CAD", Decimal("1.3")],
+        ["EUR", "CAD", Decimal("1.5")],
+        ["GBP", "USD", Decimal("1.25")],
+    ]
+    best_rates = BestRateMatrix(RateGraph(data, 4))
+    assert best_rates.arbitrage_cycles(0.001) == [
+        (["CAD", "EUR", "USD", "CAD"], Decimal("0.040052"))
+    ]
+    assert best_rates.arbitrage_cycles(0.05) == []
+
+
+def test_no_arbitrage_cycles_for_consistent_prices():
+    data = [
+        ["EUR", "USD", Decimal("1.2")],
+        ["USD", "CAD", Decimal("1.25")],
+        ["EUR", "CAD", Decimal("1.5")],
+    ]
+    best_rates = BestRateMatrix(RateGraph(data, 4))
+    assert best_rates.arbitrage_cycles(0.001) == []
+
+
+def test_best_rate_without_non_positive_prices():
+    data = [
+        ["EUR", "USD", Decimal("-1.2")],
+        ["GBP", "USD", Decimal("0")],
+        ["CAD", "USD", Decimal("0.84")],
+        ["EUR", "CAD", Decimal("1.5")],
+    ]
+    best_rates = BestRateMatrix(RateGraph(data, 4))
+    assert best_rates.best_rate("CAD", "USD") == Decimal("0.84")
+    assert best_rates.best_path("EUR", "USD") == ["EUR", "CAD", "USD"]
+    assert best_rates.best_rate("GBP", "USD") is None
+    assert calculate_best_rate("CAD", "USD", data, 4) == Decimal("0.84")
@@ -1,6 +1,6 @@
 from decimal import Decimal
 
-from src.best_rate_calculator import calculate_best_rate
+from src.best_rate_calculator import RateGraph, calculate_best_rate
 
 
 def test_calculate_best_rate():
@@ -10,3 +10,22 @@ def test_calculate_best_rate():
     ]
     rate = calculate_best_rate("AUD", "NZD", data, 4)
     assert rate == Decimal("1.130")
+
+
+def test_path_price_matches_reference():
+    data = [
+        ["AUD", "USD", Decimal("0.7812")],
+        ["EUR", "USD", Decimal("1.083")],
+        ["NZD", "AUD", Decimal("0.9213")],
+        ["EUR", "GBP", Decimal("0.8571")],
+    ]
+    rate_graph = RateGraph(data, 4, verify=True)
+    for sell_code in rate_graph.nodes:
+        for buy_code in rate_graph.nodes:
+            path = rate_graph.shortest_path(sell_code, buy_code)
+            price = rate_graph.path_price(path)
+            assert str(price) == str(rate_graph._get_reference_path_price(path))
+    rate_graph = rate_graph.with_prices(
+        [[sell_code, buy_code, price * 2] for sell_code, buy_code, price in data]
+    )
+    assert rate_graph.best_rate("NZD", "GBP") == Decimal("2.280")
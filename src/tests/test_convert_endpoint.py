@@ -0,0 +1,59 @@
+from decimal import Decimal
+
+from src.crud_utils import create_currency, create_price
+
+
+def test_convert_amounts(client, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    cad = create_currency(db, code="CAD")
+    create_currency(db, code="GBP")
+    for sell_currency, price in [(eur, "1.234"), (cad, "0.84")]:
+        create_price(
+            db,
+            date="2020-02-02",
+            sell_currency=sell_currency,
+            buy_currency=usd,
+            price=Decimal(price),
+        )
+    resp = client.post(
+        "/convert",
+        json=[
+            {"amount": "12.34", "sell": "EUR", "buy": "CAD", "date": "2020-02-02"},
+            {"amount": "0.015", "sell": "EUR", "buy": "CAD", "date": "2020-02-02"},
+            {"amount": "100", "sell": "USD", "buy": "EUR", "date": "2020-02-02"},
+            {"amount": "100", "sell": "EUR", "buy": "GBP", "date": "2020-02-02"},
+            {"amount": "100", "sell": "EUR", "buy": "JPY", "date": "2020-02-02"},
+        ],
+    )
+    assert resp.status_code == 200
+    assert resp.json() == [
+        {
+            "amount": 18.1151,
+            "rate": 1.468,
+            "path": ["EUR", "USD", "CAD"],
+            "error": None,
+        },
+        {"amount": 0.022, "rate": 1.468, "path": ["EUR", "USD", "CAD"], "error": None},
+        {"amount": 81.04, "rate": 0.8104, "path": ["USD", "EUR"], "error": None},
+        {"amount": None, "rate": None, "path": None, "error": None},
+        {
+            "amount": None,
+            "rate": None,
+            "path": None,
+            "error": "Currency 'JPY' does not exist",
+        },
+    ]
+    # Best rates of the date were calculated once
+    assert client.get("/prices/cache-stats").json()["misses"] == 1
+
+
+def test_convert_amounts_out_of_bounds(client, db):
+    for amount in ["1e25", "-1e25", "NaN"]:
+        resp = client.post(
+            "/convert",
+            json=[
+                {"amount": amount, "sell": "EUR", "buy": "USD", "date": "2020-02-02"}
+            ],
+        )
+        assert resp.status_code == 422
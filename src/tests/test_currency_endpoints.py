@@ -38,3 +38,23 @@ def test_delete_currency(client, db):
     assert resp.status_code == 204
     usd = db.query(Currency).filter_by(id=usd.id).first()
     assert usd is None
+
+
+def test_update_currency_refreshes_registry(client, db):
+    usd = create_currency(db, code="USD")
+    create_currency(db, code="EUR")
+    assert client.get("/prices/USD/EUR/2020-02-02").status_code == 200
+    client.put(f"/currencies/{usd.id}", json={"code": "CAD"})
+    assert client.get("/prices/USD/EUR/2020-02-02").status_code == 400
+    assert client.get("/prices/CAD/EUR/2020-02-02").status_code == 200
+
+
+def test_reload_currency_registry(client, db):
+    usd = create_currency(db, code="USD")
+    create_currency(db, code="EUR")
+    assert client.get("/prices/USD/EUR/2020-02-02").status_code == 200
+    # Renamed bypassing the API, as another worker would do
+    db.query(Currency).filter_by(id=usd.id).update({"code": "CAD"})
+    resp = client.post("/currencies/registry/reload")
+    assert resp.status_code == 204
+    assert client.get("/prices/USD/EUR/2020-02-02").status_code == 400
@@ -0,0 +1,52 @@
+from decimal import Decimal
+
+from src.crud_utils import create_currency, create_price
+
+
+def test_live_best_rates(client, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    cad = create_currency(db, code="CAD")
+    create_currency(db, code="CHF")
+    for sell_currency, price in [(eur, "1.234"), (cad, "0.84")]:
+        create_price(
+            db,
+            date="2020-02-02",
+            sell_currency=sell_currency,
+            buy_currency=usd,
+            price=Decimal(price),
+        )
+    eur_cad = {"sell": "EUR", "buy": "CAD", "date": "2020-02-02"}
+    cad_eur = {"sell": "CAD", "buy": "EUR", "date": "2020-02-02"}
+    with client.websocket_connect("/live") as websocket:
+        websocket.send_json(
+            {
+                "subscribe": [
+                    eur_cad,
+                    {"sell": "EUR", "buy": "GBP", "date": "2020-02-02"},
+                ]
+            }
+        )
+        assert websocket.receive_json() == {"error": "Currency 'GBP' does not exist"}
+        assert websocket.receive_json() == {**eur_cad, "price": 1.468}
+
+        client.put("/prices/EUR/USD/2020-02-02", json={"value": "1.111"})
+        assert websocket.receive_json() == {**eur_cad, "price": 1.322}
+
+        # Neither prices of other dates nor unchanged rates are sent
+        client.post(
+            "/prices/",
+            json={"date": "2020-02-03", "sell": "EUR", "buy": "USD", "value": "1.3"},
+        )
+        client.post(
+            "/prices/",
+            json={"date": "2020-02-02", "sell": "CHF", "buy": "USD", "value": "1.1"},
+        )
+        websocket.send_json({"unsubscribe": [eur_cad], "subscribe": [cad_eur]})
+        assert websocket.receive_json() == {**cad_eur, "price": 0.7561}
+
+        client.delete("/prices/CAD/USD/2020-02-02")
+        assert websocket.receive_json() == {**cad_eur, "price": None}
+
+        websocket.send_json({"subscribe": "EUR"})
+        assert "error" in websocket.receive_json()
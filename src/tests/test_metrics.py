@@ -0,0 +1,74 @@
+import re
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from src import metrics
+from src.crud_utils import create_currency, create_price
+
+RATE_ROUTE_LABELS = (
+    'method="GET",route="/prices/{sell_currency_code}/{buy_currency_code}/{date}"'
+)
+
+
+@pytest.fixture
+def instrumented_engine(engine):
+    metrics.instrument_engine(engine)
+    yield engine
+    for identifier, listener in metrics.ENGINE_LISTENERS:
+        event.remove(engine, identifier, listener)
+
+
+def test_metrics(client, db, instrumented_engine, caplog, monkeypatch):
+    monkeypatch.setattr(metrics, "SLOW_REQUEST_SECONDS", 1e-9)
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    create_price(
+        db,
+        date="2020-02-02",
+        sell_currency=eur,
+        buy_currency=usd,
+        price=Decimal("1.234"),
+    )
+    # Metrics are kept per process, other tests may have requested the route
+    statements_before = _get_sql_statements_sum(client, RATE_ROUTE_LABELS)
+    assert client.get("/prices/EUR/USD/2020-02-02").status_code == 200
+    assert "Slow request GET /prices/{sell_currency_code}" in caplog.text
+    assert "rate_graph" in caplog.text
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    lines = resp.text.splitlines()
+    assert any(
+        line.startswith(
+            f'http_request_duration_seconds_count{{{RATE_ROUTE_LABELS},status="200"}}'
+        )
+        for line in lines
+    )
+    # Currencies, version and prices of the date
+    statements = _get_sql_statements_sum(client, RATE_ROUTE_LABELS)
+    assert statements - statements_before == 3
+    assert any(
+        line.startswith('span_duration_seconds_count{span="rate_graph"}')
+        for line in lines
+    )
+
+
+def test_server_timing_header(client, db, instrumented_engine, monkeypatch):
+    create_currency(db, code="USD")
+    resp = client.get("/currencies/")
+    assert "server-timing" not in resp.headers
+
+    monkeypatch.setattr(metrics, "SERVER_TIMING", True)
+    resp = client.get("/currencies/")
+    assert re.match(r'sql;desc="1 statements";dur=', resp.headers["server-timing"])
+
+
+def _get_sql_statements_sum(client, route_labels: str) -> float:
+    prefix = f"http_request_sql_statements_sum{{{route_labels}}}"
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith(prefix):
+            return float(line.split()[-1])
+    return 0
@@ -0,0 +1,59 @@
+import random
+import subprocess
+import sys
+
+import pytest
+
+from src.path_engines import BfsEngine, IgraphEngine, PathEngine, get_path_engine
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.filterwarnings("ignore:Couldn.t reach some vertices")
+def test_engines_find_same_paths(seed):
+    rng = random.Random(seed)
+    node_count = 30
+    edges = [
+        (rng.randrange(node_count), rng.randrange(node_count))
+        for _ in range(rng.randrange(20, 80))
+    ]
+    graphs = {
+        engine: engine.build(node_count, edges)
+        for engine in (IgraphEngine(), BfsEngine())
+    }
+    for source in range(node_count):
+        for target in range(node_count):
+            igraph_path, bfs_path = (
+                engine.shortest_path(graph, source, target)
+                for engine, graph in graphs.items()
+            )
+            assert bfs_path == igraph_path
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError, match="Unknown path engine"):
+        get_path_engine("dijkstra")
+
+
+def test_app_import_does_not_load_igraph():
+    code = "import sys, src.app; print('igraph' in sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "False"
+
+
+def test_importer_import_does_not_load_numpy():
+    code = "import sys, import_initial_data; print('numpy' in sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "False"
+
+
+def test_incomplete_engine_not_instantiated():
+    class BuildOnlyEngine(PathEngine):
+        def build(self, node_count, edges):
+            return edges
+
+    with pytest.raises(TypeError, match="shortest_path"):
+        BuildOnlyEngine()
@@ -1,7 +1,7 @@
 from datetime import date
 from decimal import Decimal
 
-from src.crud_utils import create_currency, create_price
+from src.crud_utils import bump_data_versions, create_currency, create_price
 from src.models_sqla import ExchangePairPrice
 
 
@@ -107,3 +107,510 @@ def test_get_rate(client, db):
     resp = client.get("/prices/EUR/CAD/2020-02-02")
     assert resp.status_code == 200
     assert resp.json() == {"price": 1.468}
+
+
+def test_get_rate_with_non_positive_price(client, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    cad = create_currency(db, code="CAD")
+    for sell_currency, price in [(eur, "-1.2"), (cad, "0.84")]:
+        create_price(
+            db,
+            date="2020-02-02",
+            sell_currency=sell_currency,
+            buy_currency=usd,
+            price=Decimal(price),
+        )
+    resp = client.get("/prices/CAD/USD/2020-02-02")
+    assert resp.status_code == 200
+    assert resp.json() == {"price": 0.84}
+    assert client.get("/prices/EUR/USD/2020-02-02").json() == {"price": None}
+
+
+def test_get_rate_uses_cached_graph(client, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    create_price(
+        db,
+        date="2020-02-02",
+        sell_currency=eur,
+        buy_currency=usd,
+        price=Decimal("1.234"),
+    )
+    resp = client.get("/prices/EUR/USD/2020-02-02")
+    assert resp.json() == {"price": 1.234}
+    resp = client.get("/prices/USD/EUR/2020-02-02")
+    assert resp.json() == {"price": 0.8104}
+    resp = client.get("/prices/cache-stats")
+    assert resp.json()["hits"] == 1
+    assert resp.json()["misses"] == 1
+
+    resp = client.put("/prices/EUR/USD/2020-02-02", json={"value": "1.111"})
+    assert resp.status_code == 200
+    resp = client.get("/prices/EUR/USD/2020-02-02")
+    assert resp.json() == {"price": 1.111}
+    assert client.get("/prices/cache-stats").json()["misses"] == 2
+
+
+def test_get_rate_written_by_other_process(client, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    price = create_price(
+        db,
+        date="2020-02-02",
+        sell_currency=eur,
+        buy_currency=usd,
+        price=Decimal("1.234"),
+    )
+    resp = client.get("/prices/EUR/USD/2020-02-02")
+    assert resp.json() == {"price": 1.234}
+    etag = resp.headers["ETag"]
+    # Written like the importer does, without going through the app
+    price.price = Decimal("1.111")
+    bump_data_versions(db, [date(2020, 2, 2)])
+    db.commit()
+    resp = client.get("/prices/EUR/USD/2020-02-02")
+    assert resp.json() == {"price": 1.111}
+    assert resp.headers["ETag"] != etag
+    resp = client.post(
+        "/prices/best-rates", json=[{"sell": "EUR", "buy": "USD", "date": "2020-02-02"}]
+    )
+    assert resp.json() == [{"price": 1.111, "error": None}]
+    resp = client.get(
+        "/prices/EUR/USD/best-series",
+        params={"start_date": "2020-02-02", "end_date": "2020-02-02"},
+    )
+    assert resp.json() == [{"date": "2020-02-02", "price": 1.111}]
+
+
+def test_get_rate_conditional(client, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    create_price(
+        db,
+        date="2020-02-02",
+        sell_currency=eur,
+        buy_currency=usd,
+        price=Decimal("1.234"),
+    )
+    resp = client.get("/prices/EUR/USD/2020-02-02")
+    etag = resp.headers["ETag"]
+    assert resp.headers["Cache-Control"].startswith("public")
+    resp = client.get("/prices/EUR/USD/2020-02-02", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+    # Cached graph is not used to answer conditional requests
+    assert client.get("/prices/cache-stats").json()["misses"] == 1
+
+    client.put("/prices/EUR/USD/2020-02-02", json={"value": "1.111"})
+    resp = client.get("/prices/EUR/USD/2020-02-02", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+
+
+def test_historical_prices_conditional(client, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    create_price(
+        db,
+        date="2020-02-02",
+        sell_currency=eur,
+        buy_currency=usd,
+        price=Decimal("1.234"),
+    )
+    history_url = "/prices/EUR/USD/history?start_date=2020-02-01&end_date=2020-02-03"
+    etag = client.get(history_url).headers["ETag"]
+    resp = client.get(history_url, headers={"If-None-Match": f"W/{etag}"})
+    assert resp.status_code == 304
+    assert client.get(f"{history_url}&format=csv").headers["ETag"] != etag
+
+    url = "/prices/EUR/USD?start_date=2020-02-01&end_date=2020-02-03"
+    etag = client.get(url).headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    create_price(
+        db,
+        date="2020-02-03",
+        sell_currency=eur,
+        buy_currency=usd,
+        price=Decimal("1.255"),
+    )
+    resp = client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert len(resp.json()) == 2
+
+
+def test_get_rate_as_of(client, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    cad = create_currency(db, code="CAD")
+    create_price(
+        db,
+        date="2020-01-30",
+        sell_currency=eur,
+        buy_currency=usd,
+        price=Decimal("1.111"),
+    )
+    create_price(
+        db,
+        date="2020-01-31",
+        sell_currency=eur,
+        buy_currency=usd,
+        price=Decimal("1.234"),
+    )
+    create_price(
+        db,
+        date="2020-01-29",
+        sell_currency=cad,
+        buy_currency=usd,
+        price=Decimal("0.84"),
+    )
+    create_price(
+        db,
+        date="2020-02-03",
+        sell_currency=cad,
+        buy_currency=usd,
+        price=Decimal("0.9"),
+    )
+    resp = client.get("/prices/EUR/CAD/2020-02-02")
+    assert resp.json() == {"price": None}
+    resp = client.get("/prices/EUR/CAD/2020-02-02?as_of=true")
+    assert resp.json() == {"price": 1.468}
+    etag = resp.headers["ETag"]
+    resp = client.get("/prices/CAD/EUR/2020-02-02?as_of=true")
+    assert resp.json() == {"price": 0.6807}
+    assert client.get("/prices/cache-stats").json()["hits"] == 1
+
+    # Prices of earlier dates change the last known ones
+    client.put("/prices/CAD/USD/2020-01-29", json={"value": "0.85"})
+    resp = client.get(
+        "/prices/EUR/CAD/2020-02-02?as_of=true", headers={"If-None-Match": etag}
+    )
+    assert resp.status_code == 200
+    assert resp.json() == {"price": 1.451}
+    assert client.get("/prices/cache-stats").json()["misses"] == 3
+
+
+def test_historical_prices_as_of(client, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    create_price(
+        db,
+        date="2020-01-30",
+        sell_currency=eur,
+        buy_currency=usd,
+        price=Decimal("1.234"),
+    )
+    create_price(
+        db,
+        date="2020-02-03",
+        sell_currency=eur,
+        buy_currency=usd,
+        price=Decimal("1.255"),
+    )
+    resp = client.get(
+        "/prices/EUR/USD?start_date=2020-02-01&end_date=2020-02-04&as_of=true"
+    )
+    assert resp.status_code == 200
+    assert resp.json() == [
+        {"date": "2020-02-01", "price": 1.234},
+        {"date": "2020-02-02", "price": 1.234},
+        {"date": "2020-02-03", "price": 1.255},
+        {"date": "2020-02-04", "price": 1.255},
+    ]
+    resp = client.get(
+        "/prices/EUR/USD?start_date=2020-01-28&end_date=2020-01-30&as_of=true"
+    )
+    assert resp.json() == [{"date": "2020-01-30", "price": 1.234}]
+
+
+def test_get_best_rates(client, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    cad = create_currency(db, code="CAD")
+    create_price(
+        db,
+        date="2020-02-02",
+        sell_currency=eur,
+        buy_currency=usd,
+        price=Decimal("1.234"),
+    )
+    create_price(
+        db,
+        date="2020-02-02",
+        sell_currency=cad,
+        buy_currency=usd,
+        price=Decimal("0.84"),
+    )
+    resp = client.post(
+        "/prices/best-rates",
+        json=[
+            {"sell": "EUR", "buy": "CAD", "date": "2020-02-02"},
+            {"sell": "EUR", "buy": "GBP", "date": "2020-02-02"},
+            {"sell": "EUR", "buy": "CAD", "date": "2020-02-03"},
+            {"sell": "USD", "buy": "EUR", "date": "2020-02-02"},
+        ],
+    )
+    assert resp.status_code == 200
+    assert resp.json() == [
+        {"price": 1.468, "error": None},
+        {"price": None, "error": "Currency 'GBP' does not exist"},
+        {"price": None, "error": None},
+        {"price": 0.8104, "error": None},
+    ]
+
+
+def test_bulk_upsert_prices_ndjson(client, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    create_currency(db, code="CAD")
+    create_price(
+        db,
+        date="2020-02-02",
+        sell_currency=eur,
+        buy_currency=usd,
+        price=Decimal("1.234"),
+    )
+    body = "\n".join(
+        [
+            '{"date": "2020-02-02", "sell": "EUR", "buy": "USD", "value": "1.25"}',
+            '{"date": "2020-02-02", "sell": "CAD", "buy": "USD", "value": "0.84"}',
+            '{"date": "2020-02-02", "sell": "USD", "buy": "EUR", "value": "0.8"}',
+            '{"date": "2020-02-02", "sell": "GBP", "buy": "USD", "value": "1.3"}',
+            '{"date": "2020-02-02", "sell": "CAD"}',
+        ]
+    )
+    resp = client.post(
+        "/prices/bulk?batch_size=2",
+        data=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["upserted"] == 2
+    assert [(e["line"], e["detail"]) for e in resp.json()["errors"][:2]] == [
+        (3, "Price already exists"),
+        (4, "Currency 'GBP' does not exist"),
+    ]
+    assert resp.json()["errors"][2]["line"] == 5
+    prices = {
+        (p.sell_currency.code, p.buy_currency.code): p.price
+        for p in db.query(ExchangePairPrice)
+    }
+    assert prices == {
+        ("EUR", "USD"): Decimal("1.2500"),
+        ("CAD", "USD"): Decimal("0.8400"),
+    }
+
+
+def test_bulk_upsert_prices_csv(client, db):
+    create_currency(db, code="USD")
+    create_currency(db, code="EUR")
+    body = "date,sell,buy,value\n2020-02-02,EUR,USD,1.234\n2020-02-03,EUR,USD,1.255\n"
+    resp = client.post(
+        "/prices/bulk",
+        data=body,
+        headers={"Content-Type": "text/csv"},
+    )
+    assert resp.status_code == 200
+    assert resp.json() == {"upserted": 2, "errors": []}
+    assert [p.price for p in db.query(ExchangePairPrice).order_by("date")] == [
+        Decimal("1.2340"),
+        Decimal("1.2550"),
+    ]
+
+
+def test_bulk_upsert_prices_malformed_lines(client, db):
+    create_currency(db, code="USD")
+    create_currency(db, code="EUR")
+    resp = client.post(
+        "/prices/bulk",
+        data="date,sell,buy,value\n2020-02-02,EUR,USD\n",
+        headers={"Content-Type": "text/csv"},
+    )
+    assert resp.status_code == 400
+    assert resp.json() == {"detail": "Line 2 has 3 fields, header has 4"}
+    resp = client.post(
+        "/prices/bulk",
+        data=b'{"date": "2020-02-02", "sell": "EUR", "buy": "USD", "value": 1}\n\xff\n',
+    )
+    assert resp.status_code == 400
+    assert resp.json() == {"detail": "Line 2 is not valid UTF-8"}
+
+
+def test_bulk_upsert_prices_non_positive_values(client, db):
+    create_currency(db, code="USD")
+    create_currency(db, code="EUR")
+    create_currency(db, code="CAD")
+    body = "date,sell,buy,value\n2020-02-02,EUR,USD,-1.2\n2020-02-02,CAD,USD,0\n"
+    resp = client.post(
+        "/prices/bulk",
+        data=body + "2020-02-03,EUR,USD,1.255\n",
+        headers={"Content-Type": "text/csv"},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["upserted"] == 1
+    errors = resp.json()["errors"]
+    assert [error["line"] for error in errors] == [2, 3]
+    assert all("greater than 0" in error["detail"] for error in errors)
+    assert [p.price for p in db.query(ExchangePairPrice)] == [Decimal("1.2550")]
+
+
+def test_stream_historical_prices(client, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    prices = [("2019-01-01", "1.1"), ("2019-06-01", "1.2"), ("2020-02-03", "1.3")]
+    for day, price in prices:
+        create_price(
+            db, date=day, sell_currency=eur, buy_currency=usd, price=Decimal(price)
+        )
+    resp = client.get(
+        "/prices/EUR/USD/history?start_date=2019-01-01&end_date=2020-12-31"
+    )
+    assert resp.status_code == 200
+    assert "X-Next-Cursor" not in resp.headers
+    assert resp.json() == [
+        {"date": "2019-01-01", "price": 1.1},
+        {"date": "2019-06-01", "price": 1.2},
+        {"date": "2020-02-03", "price": 1.3},
+    ]
+
+    resp = client.get(
+        "/prices/EUR/USD/history?start_date=2019-01-01&end_date=2020-12-31&limit=2"
+    )
+    assert resp.json() == [
+        {"date": "2019-01-01", "price": 1.1},
+        {"date": "2019-06-01", "price": 1.2},
+    ]
+    cursor = resp.headers["X-Next-Cursor"]
+    resp = client.get(
+        "/prices/EUR/USD/history?end_date=2020-12-31&limit=2"
+        f"&format=csv&cursor={cursor}"
+    )
+    assert "X-Next-Cursor" not in resp.headers
+    assert resp.text == "date,price\n2020-02-03,1.3000\n"
+
+
+def test_aggregate_prices(client, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    prices = [
+        ("2020-02-03", "1.1"),
+        ("2020-02-04", "1.3"),
+        ("2020-02-05", "1.2"),
+        ("2020-02-10", "1.25"),
+    ]
+    for day, price in prices:
+        create_price(
+            db, date=day, sell_currency=eur, buy_currency=usd, price=Decimal(price)
+        )
+    resp = client.get(
+        "/prices/EUR/USD/aggregate?start_date=2020-02-01&end_date=2020-02-29"
+    )
+    assert resp.status_code == 200
+    assert resp.json() == [
+        {
+            "start_date": "2020-02-03",
+            "open": 1.1,
+            "high": 1.3,
+            "low": 1.1,
+            "close": 1.2,
+            "mean": 1.2,
+            "count": 3,
+        },
+        {
+            "start_date": "2020-02-10",
+            "open": 1.25,
+            "high": 1.25,
+            "low": 1.25,
+            "close": 1.25,
+            "mean": 1.25,
+            "count": 1,
+        },
+    ]
+
+    resp = client.get(
+        "/prices/USD/EUR/aggregate?start_date=2020-02-03&end_date=2020-02-29"
+        "&bucket_days=14"
+    )
+    assert resp.json() == [
+        {
+            "start_date": "2020-02-03",
+            "open": 0.9091,
+            "high": 0.9091,
+            "low": 0.7692,
+            "close": 0.8,
+            "mean": 0.8279,
+            "count": 4,
+        },
+    ]
+
+
+def test_aggregate_prices_inverted_like_best_rates(client, db):
+    usd = create_currency(db, code="USD")
+    jpy = create_currency(db, code="JPY")
+    create_price(
+        db,
+        date="2020-02-03",
+        sell_currency=usd,
+        buy_currency=jpy,
+        price=Decimal("150"),
+    )
+    resp = client.get(
+        "/prices/JPY/USD/aggregate?start_date=2020-02-01&end_date=2020-02-29"
+    )
+    assert resp.json()[0]["close"] == 0.006667
+    assert client.get("/prices/JPY/USD/2020-02-03").json() == {"price": 0.006667}
+
+
+def test_get_best_rate_series(client, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    cad = create_currency(db, code="CAD")
+    prices = [
+        ("2020-02-02", eur, usd, "1.234"),
+        ("2020-02-02", cad, usd, "0.84"),
+        ("2020-02-03", eur, usd, "1.25"),
+        ("2020-02-03", cad, usd, "0.84"),
+        ("2020-02-04", eur, usd, "1.25"),
+    ]
+    for day, sell, buy, price in prices:
+        create_price(
+            db, date=day, sell_currency=sell, buy_currency=buy, price=Decimal(price)
+        )
+    resp = client.get(
+        "/prices/EUR/CAD/best-series?start_date=2020-02-01&end_date=2020-02-05"
+    )
+    assert resp.status_code == 200
+    assert resp.json() == [
+        {"date": "2020-02-02", "price": 1.468},
+        {"date": "2020-02-03", "price": 1.488},
+        {"date": "2020-02-04", "price": None},
+    ]
+    for item in resp.json():
+        single_resp = client.get(f"/prices/EUR/CAD/{item['date']}")
+        assert single_resp.json() == {"price": item["price"]}
+    # Best rates of dates are cached for other requests
+    stats = client.get("/prices/cache-stats").json()
+    assert (stats["hits"], stats["misses"]) == (3, 3)
+
+
+def test_find_arbitrage(client, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    cad = create_currency(db, code="CAD")
+    prices = [(eur, usd, "1.2"), (usd, cad, "1.3"), (eur, cad, "1.5")]
+    for sell, buy, price in prices:
+        create_price(
+            db,
+            date="2020-02-02",
+            sell_currency=sell,
+            buy_currency=buy,
+            price=Decimal(price),
+        )
+    resp = client.get("/prices/arbitrage/2020-02-02")
+    assert resp.status_code == 200
+    assert resp.json() == {
+        "date": "2020-02-02",
+        "cycles": [{"path": ["CAD", "EUR", "USD", "CAD"], "gain": 0.040052}],
+    }
+    resp = client.get("/prices/arbitrage?start_date=2020-02-01&end_date=2020-02-03")
+    assert [item["date"] for item in resp.json()] == ["2020-02-02"]
@@ -0,0 +1,80 @@
+import csv
+import io
+from decimal import Decimal
+
+from sqlalchemy import event
+
+from import_initial_data import _get_prices_from_row
+from src.crud_utils import create_currency, create_price
+from src.price_export import iter_wide_csv
+
+
+def test_export_prices(client, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    cad = create_currency(db, code="CAD")
+    for day, sell_currency, price in [
+        ("2020-02-02", eur, "1.234"),
+        ("2020-02-02", cad, "0.84"),
+        ("2020-02-03", eur, "1.25"),
+        ("2020-02-04", cad, "0.85"),
+    ]:
+        create_price(
+            db,
+            date=day,
+            sell_currency=sell_currency,
+            buy_currency=usd,
+            price=Decimal(price),
+        )
+    resp = client.get("/prices/export")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/csv")
+    assert resp.text == (
+        "Date,CAD/USD,EUR/USD\n"
+        "2020-02-02,0.8400,1.2340\n"
+        "2020-02-03,,1.2500\n"
+        "2020-02-04,0.8500,\n"
+    )
+    # Rows are read back by the import as the exported prices
+    reader = csv.DictReader(io.StringIO(resp.text))
+    prices = [
+        (day, sell, buy, Decimal(price))
+        for row in reader
+        for day, sell, buy, price in _get_prices_from_row(row)
+        if price
+    ]
+    assert ("2020-02-03", "EUR", "USD", Decimal("1.25")) in prices
+    assert len(prices) == 4
+
+    resp = client.get(
+        "/prices/export",
+        params={"pairs": ["EUR/USD"], "start_date": "2020-02-03"},
+    )
+    assert resp.text == "Date,EUR/USD\n2020-02-03,1.2500\n"
+
+    resp = client.get("/prices/export", params={"pairs": ["EUR/GBP"]})
+    assert resp.status_code == 400
+    assert resp.json() == {"detail": "Currency 'GBP' does not exist"}
+
+    resp = client.get("/prices/export", params={"pairs": ["EURUSD"]})
+    assert resp.status_code == 422
+
+
+def test_full_export_not_filtered_by_pairs(engine, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    create_price(
+        db, date="2020-02-02", sell_currency=eur, buy_currency=usd, price=Decimal(1)
+    )
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        lines = list(iter_wide_csv(db))
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert lines == ["Date,EUR/USD\n", "2020-02-02,1.0000\n"]
+    assert not any(" IN " in statement for statement in statements)
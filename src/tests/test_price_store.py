@@ -0,0 +1,143 @@
+import os
+import shutil
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import text
+
+from src.crud_utils import create_currency, create_price
+from src.price_store import build_snapshot, price_store
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    price_store.configure(str(tmp_path))
+    yield str(tmp_path)
+    price_store.configure(None)
+
+
+@pytest.fixture
+def currencies(db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    cad = create_currency(db, code="CAD")
+    for day, sell_currency, buy_currency, price in [
+        ("2020-02-02", eur, usd, "1.234"),
+        ("2020-02-02", cad, usd, "0.84"),
+        ("2020-02-03", eur, usd, "1.255"),
+        ("2020-02-05", cad, usd, "0.85"),
+    ]:
+        create_price(
+            db,
+            date=day,
+            sell_currency=sell_currency,
+            buy_currency=buy_currency,
+            price=Decimal(price),
+        )
+    return usd, eur, cad
+
+
+def _set_price_unversioned(db, day, sell_currency, buy_currency, price):
+    # Changed behind the store, only visible when reading from the database
+    db.execute(
+        text(
+            "UPDATE exchangepairprice SET price = :price WHERE date = :date "
+            "AND sell_currency_id = :sell_id AND buy_currency_id = :buy_id"
+        ),
+        {
+            "price": price,
+            "date": day,
+            "sell_id": sell_currency.id,
+            "buy_id": buy_currency.id,
+        },
+    )
+
+
+def test_prices_read_from_snapshot(client, db, currencies, store_path):
+    usd, eur, cad = currencies
+    build_snapshot(db, store_path)
+    _set_price_unversioned(db, date(2020, 2, 2), eur, usd, "2.0")
+    _set_price_unversioned(db, date(2020, 2, 3), eur, usd, "2.0")
+
+    assert client.get("/prices/EUR/CAD/2020-02-02").json() == {"price": 1.468}
+    assert client.get("/prices/EUR/USD/2020-02-04?as_of=true").json() == {
+        "price": 1.255
+    }
+    resp = client.get("/prices/EUR/USD?start_date=2020-02-01&end_date=2020-02-05")
+    assert resp.json() == [
+        {"date": "2020-02-02", "price": 1.234},
+        {"date": "2020-02-03", "price": 1.255},
+    ]
+
+
+def test_written_prices_applied_to_store(client, db, currencies, store_path):
+    usd, eur, cad = currencies
+    build_snapshot(db, store_path)
+    client.put("/prices/EUR/USD/2020-02-02", json={"value": "1.111"})
+    client.delete("/prices/EUR/USD/2020-02-03")
+    client.post(
+        "/prices/",
+        json={"date": "2020-02-03", "sell": "CAD", "buy": "USD", "value": "0.8"},
+    )
+    _set_price_unversioned(db, date(2020, 2, 2), cad, usd, "2.0")
+    _set_price_unversioned(db, date(2020, 2, 3), cad, usd, "2.0")
+
+    assert client.get("/prices/EUR/CAD/2020-02-02").json() == {"price": 1.322}
+    assert client.get("/prices/CAD/USD/2020-02-03").json() == {"price": 0.8}
+    resp = client.get("/prices/EUR/USD?start_date=2020-02-01&end_date=2020-02-05")
+    assert resp.json() == [{"date": "2020-02-02", "price": 1.111}]
+    # Latest prices are read from the database once dates were changed
+    assert client.get("/prices/CAD/USD/2020-02-04?as_of=true").json() == {"price": 2.0}
+
+
+def test_changed_versions_read_from_database(client, db, currencies, store_path):
+    usd, eur, cad = currencies
+    build_snapshot(db, store_path)
+    # Written by another process, so unknown to the store of this one
+    create_price(
+        db,
+        date="2020-02-02",
+        sell_currency=eur,
+        buy_currency=cad,
+        price=Decimal("1.5"),
+    )
+    client.put("/prices/EUR/USD/2020-02-02", json={"value": "1.111"})
+    _set_price_unversioned(db, date(2020, 2, 2), cad, usd, "2.0")
+
+    assert client.get("/prices/CAD/USD/2020-02-02").json() == {"price": 2.0}
+    resp = client.get("/prices/CAD/USD?start_date=2020-02-01&end_date=2020-02-05")
+    assert resp.json() == [
+        {"date": "2020-02-02", "price": 2.0},
+        {"date": "2020-02-05", "price": 0.85},
+    ]
+
+
+def test_new_snapshot_replaces_current(db, currencies, store_path):
+    usd, eur, cad = currencies
+    build_snapshot(db, store_path)
+    assert len(price_store.get_prices(date(2020, 2, 2), 2)) == 2
+    create_price(
+        db,
+        date="2020-02-02",
+        sell_currency=eur,
+        buy_currency=cad,
+        price=Decimal("1.5"),
+    )
+    assert price_store.get_prices(date(2020, 2, 2), 3) is None
+    build_snapshot(db, store_path)
+    assert len(price_store.get_prices(date(2020, 2, 2), 3)) == 3
+
+
+def test_previous_snapshot_kept_until_next_build(db, currencies, store_path):
+    first_path = build_snapshot(db, store_path)
+    assert len(price_store.get_prices(date(2020, 2, 2), 2)) == 2
+    second_path = build_snapshot(db, store_path)
+    assert os.path.exists(first_path)
+    third_path = build_snapshot(db, store_path)
+    assert sorted(os.listdir(store_path)) == sorted(
+        ["current", os.path.basename(second_path), os.path.basename(third_path)]
+    )
+    # Snapshot removed before it was loaded is read from the database instead
+    shutil.rmtree(third_path)
+    assert price_store.get_prices(date(2020, 2, 2), 2) is None
@@ -0,0 +1,211 @@
+import json
+from datetime import date
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from src.crud_utils import create_currency
+from src.models_sqla import ExchangePairPrice
+
+# Tables big enough in production for a sequential scan to be a regression
+LARGE_TABLES = {"exchangepairprice"}
+SEED_CURRENCY_CODES = [f"A{letter}A" for letter in "ABCDEFGHIJKLMNOPQRST"]
+SEED_START_DATE = date(2010, 1, 1)
+SEED_DAYS = 3000
+# Every currency is quoted against the next few ones
+SEED_PAIRS_PER_CURRENCY = 3
+
+ROUTER_REQUESTS = [
+    ("get", "/prices/ABA/ACA?start_date=2015-01-01&end_date=2015-03-01", {}),
+    (
+        "get",
+        "/prices/ABA/ACA/history?start_date=2015-01-01&end_date=2015-12-31&limit=50",
+        {},
+    ),
+    (
+        "get",
+        "/prices/ACA/ABA/aggregate?start_date=2015-01-01&end_date=2015-12-31",
+        {},
+    ),
+    (
+        "get",
+        "/prices/ABA/AEA/best-series?start_date=2015-01-01&end_date=2015-01-05",
+        {},
+    ),
+    ("get", "/prices/ABA/AEA/2015-01-01", {}),
+    ("get", "/prices/ABA/AEA/2015-01-01?as_of=true", {}),
+    (
+        "get",
+        "/prices/ABA/ACA?start_date=2015-01-01&end_date=2015-03-01&as_of=true",
+        {},
+    ),
+    (
+        "post",
+        "/prices/best-rates",
+        {"json": [{"date": "2015-01-01", "sell": "ABA", "buy": "AEA"}]},
+    ),
+    (
+        "post",
+        "/convert",
+        {"json": [{"amount": "10", "date": "2015-01-01", "sell": "ABA", "buy": "AEA"}]},
+    ),
+    ("get", "/prices/arbitrage/2015-01-01", {}),
+    ("get", "/prices/arbitrage?start_date=2015-01-01&end_date=2015-01-05", {}),
+    (
+        "post",
+        "/prices/",
+        {"json": {"date": "2015-01-01", "sell": "ABA", "buy": "ATA", "value": "1.5"}},
+    ),
+    (
+        "post",
+        "/prices/bulk",
+        {
+            "data": json.dumps(
+                {"date": "2015-01-01", "sell": "ATA", "buy": "AKA", "value": "1.5"}
+            )
+        },
+    ),
+    ("put", "/prices/ABA/ACA/2015-01-01", {"json": {"value": "1.1"}}),
+    ("delete", "/prices/ABA/ACA/2015-01-01", {}),
+    ("delete", "/currencies/{unquoted_currency_id}", {}),
+]
+
+
+@pytest.fixture(scope="module")
+def seeded_connection(engine):
+    """Connection holding prices seeded once for all cases, rolled back after"""
+    connection = engine.connect()
+    transaction = connection.begin()
+    db = Session(bind=connection)
+    # Test databases may have been created before the indexes were added
+    for index in ExchangePairPrice.__table__.indexes:
+        index.create(bind=connection, checkfirst=True)
+    currencies = [create_currency(db, code=code) for code in SEED_CURRENCY_CODES]
+    pairs = [
+        (sell_currency.id, buy_currency.id)
+        for i, sell_currency in enumerate(currencies)
+        for buy_currency in currencies[i + 1 : i + 1 + SEED_PAIRS_PER_CURRENCY]
+    ]
+    db.execute(
+        text(
+            """
+            INSERT INTO exchangepairprice
+                (date, sell_currency_id, buy_currency_id, price)
+            SELECT CAST(:start_date AS date) + day, pair.sell_id, pair.buy_id,
+                round(CAST(0.5 + random() AS numeric), 4)
+            FROM generate_series(0, :days - 1) AS day,
+                unnest(CAST(:sell_ids AS int[]), CAST(:buy_ids AS int[]))
+                    AS pair(sell_id, buy_id)
+            """
+        ),
+        {
+            "start_date": SEED_START_DATE,
+            "days": SEED_DAYS,
+            "sell_ids": [sell_id for sell_id, _ in pairs],
+            "buy_ids": [buy_id for _, buy_id in pairs],
+        },
+    )
+    db.execute(text("ANALYZE exchangepairprice"))
+    unquoted_currency = create_currency(db, code="ZZZ")
+    db.close()
+    yield connection, {"unquoted_currency_id": unquoted_currency.id}
+    transaction.rollback()
+    connection.close()
+
+
+@pytest.fixture
+def seeded_db(seeded_connection):
+    _, seeded_ids = seeded_connection
+    return seeded_ids
+
+
+@pytest.fixture
+def db(seeded_connection):
+    """Session on the seeded connection, changes of a case are rolled back"""
+    connection, _ = seeded_connection
+    case_savepoint = connection.begin_nested()
+    db = Session(bind=connection)
+    # Commits of the session release the inner savepoint only
+    savepoint = connection.begin_nested()
+
+    @event.listens_for(db, "after_transaction_end")
+    def restart_savepoint(session, transaction):
+        nonlocal savepoint
+        if not savepoint.is_active:
+            savepoint = connection.begin_nested()
+
+    yield db
+    db.close()
+    savepoint.rollback()
+    case_savepoint.rollback()
+
+
+@pytest.fixture
+def captured_queries(engine, seeded_db):
+    queries = []
+
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        queries.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield queries
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.mark.parametrize("method,url,kwargs", ROUTER_REQUESTS)
+def test_router_queries_use_indexes(
+    client, db, seeded_db, captured_queries, method, url, kwargs
+):
+    resp = client.request(method, url.format(**seeded_db), **kwargs)
+    assert resp.status_code < 300, resp.text
+    queries = list(captured_queries)
+    del captured_queries[:]
+    large_table_queries = [
+        (statement, parameters)
+        for statement, parameters in queries
+        if _is_plannable(statement)
+        and any(table in statement for table in LARGE_TABLES)
+    ]
+    assert large_table_queries
+    for statement, parameters in large_table_queries:
+        plan = _explain(db, statement, parameters)
+        seq_scans = [
+            node["Relation Name"]
+            for node in _iter_plan_nodes(plan)
+            if node["Node Type"] == "Seq Scan"
+            and node.get("Relation Name") in LARGE_TABLES
+        ]
+        assert not seq_scans, f"Sequential scan of {seq_scans} in:\n{statement}"
+
+
+def _is_plannable(statement: str) -> bool:
+    return statement.lstrip().split(None, 1)[0].upper() in {
+        "SELECT",
+        "INSERT",
+        "UPDATE",
+        "DELETE",
+        "WITH",
+    }
+
+
+def _explain(db, statement, parameters) -> dict:
+    if isinstance(parameters, (list, tuple)) and parameters:
+        # Statement executed for many parameter sets
+        parameters = parameters[0]
+    plan = (
+        db.connection()
+        .exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+        .scalar()
+    )
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def _iter_plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _iter_plan_nodes(child)
@@ -0,0 +1,113 @@
+from decimal import Decimal
+
+import pytest
+
+from src.crud_utils import create_currency, create_price
+from src.rate_executor import RateExecutor, RateExecutorUnavailable, rate_executor
+
+DATA = [
+    ("EUR", "USD", Decimal("1.234")),
+    ("CAD", "USD", Decimal("0.84")),
+]
+
+
+@pytest.fixture
+def executor():
+    executor = RateExecutor(workers=1, timeout=30, max_pending=2)
+    yield executor
+    executor.shutdown()
+
+
+@pytest.fixture
+def enabled_executor():
+    rate_executor.configure(workers=1, timeout=30, max_pending=2)
+    yield rate_executor
+    rate_executor.configure(workers=0, timeout=5, max_pending=0)
+
+
+def test_best_rates(executor):
+    assert executor.best_rates(
+        ("2020-02-02", 1),
+        lambda: DATA,
+        [("EUR", "CAD"), ("CAD", "EUR"), ("EUR", "GBP")],
+        4,
+    ) == [Decimal("1.468"), Decimal("0.6807"), None]
+    # Data of a key calculated before is neither read nor sent
+    assert executor.best_rates(("2020-02-02", 1), list, [("EUR", "CAD")], 4) == [
+        Decimal("1.468")
+    ]
+
+
+def test_timeout_and_backpressure(executor):
+    executor.configure(workers=1, timeout=0.001, max_pending=1)
+    # Starting a worker process alone takes longer than the timeout
+    with pytest.raises(RateExecutorUnavailable, match="timed out"):
+        executor.best_rates("key", lambda: DATA, [("EUR", "CAD")], 4)
+    # Calculation not waited for still takes the only slot
+    with pytest.raises(RateExecutorUnavailable, match="pending"):
+        executor.best_rates("key", lambda: DATA, [("EUR", "CAD")], 4)
+
+
+def test_endpoints_use_executor(client, db, enabled_executor):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    cad = create_currency(db, code="CAD")
+    for sell_currency, price in [(eur, "1.234"), (cad, "0.84")]:
+        create_price(
+            db,
+            date="2020-02-02",
+            sell_currency=sell_currency,
+            buy_currency=usd,
+            price=Decimal(price),
+        )
+    assert client.get("/prices/EUR/CAD/2020-02-02").json() == {"price": 1.468}
+    assert client.get("/prices/EUR/CAD/2020-02-05?as_of=true").json() == {
+        "price": 1.468
+    }
+    resp = client.post(
+        "/prices/best-rates",
+        json=[
+            {"date": "2020-02-02", "sell": "CAD", "buy": "EUR"},
+            {"date": "2020-02-02", "sell": "EUR", "buy": "GBP"},
+            {"date": "2020-02-03", "sell": "CAD", "buy": "EUR"},
+        ],
+    )
+    assert resp.json() == [
+        {"price": 0.6807, "error": None},
+        {"price": None, "error": "Currency 'GBP' does not exist"},
+        {"price": None, "error": None},
+    ]
+    resp = client.post(
+        "/convert",
+        json=[{"amount": "10", "sell": "EUR", "buy": "CAD", "date": "2020-02-02"}],
+    )
+    assert resp.json() == [
+        {"amount": 14.68, "rate": 1.468, "path": ["EUR", "USD", "CAD"], "error": None}
+    ]
+    resp = client.get(
+        "/prices/EUR/CAD/best-series?start_date=2020-02-01&end_date=2020-02-03"
+    )
+    assert resp.json() == [{"date": "2020-02-02", "price": 1.468}]
+    eur_cad = {"sell": "EUR", "buy": "CAD", "date": "2020-02-02"}
+    with client.websocket_connect("/live") as websocket:
+        websocket.send_json({"subscribe": [eur_cad]})
+        assert websocket.receive_json() == {**eur_cad, "price": 1.468}
+        client.put("/prices/EUR/USD/2020-02-02", json={"value": "1.111"})
+        assert websocket.receive_json() == {**eur_cad, "price": 1.322}
+    # Locally calculated best rates are not used
+    assert client.get("/prices/cache-stats").json()["misses"] == 0
+
+    # Best rates cached by workers are not used for renamed currencies
+    client.put(f"/currencies/{cad.id}", json={"code": "CAX"})
+    assert client.get("/prices/EUR/CAX/2020-02-02").json() == {"price": 1.322}
+
+    enabled_executor.configure(workers=1, timeout=30, max_pending=0)
+    eur_cax = {"sell": "EUR", "buy": "CAX", "date": "2020-02-03"}
+    for resp in [
+        client.get("/prices/EUR/CAX/2020-02-03"),
+        client.post("/prices/best-rates", json=[eur_cax]),
+        client.post("/convert", json=[{**eur_cax, "amount": "10"}]),
+        client.get("/prices/EUR/CAX/best-series?start_date=2020-02-02"),
+    ]:
+        assert resp.status_code == 503
+        assert resp.headers["retry-after"] == "1"
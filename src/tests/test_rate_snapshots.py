@@ -0,0 +1,75 @@
+from datetime import date
+from decimal import Decimal
+
+from src import rate_snapshots
+from src.crud_utils import create_currency, create_price
+from src.models_sqla import BestRateSnapshot
+from src.rate_snapshots import get_stale_dates, refresh_snapshots
+
+
+def test_refresh_snapshots(client, db, monkeypatch):
+    monkeypatch.setattr(rate_snapshots, "BEST_RATE_SNAPSHOTS", True)
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    cad = create_currency(db, code="CAD")
+    create_price(
+        db,
+        date="2020-02-02",
+        sell_currency=eur,
+        buy_currency=usd,
+        price=Decimal("1.234"),
+    )
+    create_price(
+        db,
+        date="2020-02-02",
+        sell_currency=cad,
+        buy_currency=usd,
+        price=Decimal("0.84"),
+    )
+    create_price(
+        db,
+        date="2020-02-03",
+        sell_currency=eur,
+        buy_currency=usd,
+        price=Decimal("1.255"),
+    )
+    assert get_stale_dates(db) == [date(2020, 2, 2), date(2020, 2, 3)]
+    refresh_snapshots(db)
+    assert get_stale_dates(db) == []
+    snapshot = (
+        db.query(BestRateSnapshot)
+        .filter_by(
+            date=date(2020, 2, 2), sell_currency_id=eur.id, buy_currency_id=cad.id
+        )
+        .one()
+    )
+    assert snapshot.price == Decimal("1.468")
+    assert snapshot.path == [eur.id, usd.id, cad.id]
+
+    # Fresh snapshot is served instead of calculating the rate
+    snapshot.price = Decimal("9.999")
+    db.commit()
+    assert client.get("/prices/EUR/CAD/2020-02-02").json() == {"price": 9.999}
+    assert client.get("/prices/cache-stats").json()["misses"] == 0
+
+    client.put("/prices/EUR/USD/2020-02-02", json={"value": "1.111"})
+    assert get_stale_dates(db) == [date(2020, 2, 2)]
+    assert client.get("/prices/EUR/CAD/2020-02-02").json() == {"price": 1.322}
+    refresh_snapshots(db)
+    assert get_stale_dates(db) == []
+
+
+def test_snapshots_not_looked_up_unless_set(client, db):
+    usd = create_currency(db, code="USD")
+    eur = create_currency(db, code="EUR")
+    create_price(
+        db,
+        date="2020-02-02",
+        sell_currency=eur,
+        buy_currency=usd,
+        price=Decimal("1.234"),
+    )
+    refresh_snapshots(db)
+    db.query(BestRateSnapshot).update({"price": Decimal("9.999")})
+    db.commit()
+    assert client.get("/prices/EUR/USD/2020-02-02").json() == {"price": 1.234}